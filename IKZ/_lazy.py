@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+    Lazy import of the submodules of the IKZ subpackages.
+
+    In the ``__init__.py`` of a subpackage:
+
+        __getattr__, __dir__ = lazy_submodules(__name__, ("io", "export"))
+"""
+
+import sys
+import importlib
+
+
+def lazy_submodules(package, names):
+    """
+        Returns the module level functions ``__getattr__`` and ``__dir__``
+        (PEP 562) of ``package``, which import the submodules ``names`` on
+        first access.
+
+        Python < 3.7 does not support module ``__getattr__``, so the
+        submodules are imported immediately instead.
+    """
+    module = sys.modules[package]
+
+    def __getattr__(name):
+        if name in names:
+            return importlib.import_module("." + name, package)
+        raise AttributeError("module %r has no attribute %r" % (package, name))
+
+    def __dir__():
+        return sorted(set(vars(module)).union(names))
+
+    if sys.version_info < (3, 7):
+        for name in names:
+            importlib.import_module("." + name, package)
+    return __getattr__, __dir__
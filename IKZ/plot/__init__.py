@@ -5,5 +5,9 @@ Created on Wed May  8 13:44:32 2019
 @author: richter
 """
 
+from .._lazy import lazy_submodules
 
-from . import interactive
+# submodules are imported on first access to keep the import fast
+_submodules = ("interactive", "transparency")
+
+__getattr__, __dir__ = lazy_submodules(__name__, _submodules)
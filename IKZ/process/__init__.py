@@ -3,5 +3,9 @@
 @author: richter
 """
 
+from .._lazy import lazy_submodules
 
-from . import array
+# submodules are imported on first access to keep the import fast
+_submodules = ("array", "reductions", "detector", "frames")
+
+__getattr__, __dir__ = lazy_submodules(__name__, _submodules)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+    Corrections of area detector frames.
+
+    A CorrectionPipeline combines flat-field, dead/hot pixel mask and module
+    gaps into one gain array, which is computed once per detector
+    configuration. It is applied to whole stacks or to chunks of frames
+    followed by the normalization to the counting time:
+
+        pipe = get_pipeline("HyPix3000(H)", flatfield=flat, mask=hot)
+        corrected = pipe.apply(rasx.images, count_time=1.)
+
+    The computation is done in the pipeline ``dtype`` (default: float32)
+    without float64 temporaries.
+"""
+
+import hashlib
+import collections
+import numpy as np
+
+from .reductions import iter_chunks
+
+
+DetectorSpec = collections.namedtuple("DetectorSpec", ("shape", "gaps"))
+
+# ``gaps``: index expressions (e.g. np.s_[:, 256:259]) of the insensitive
+# pixels between detector modules. None are known for the HyPix3000, so
+# they have to be given to the pipeline if needed.
+DETECTORS = {
+    'HyPix3000(H)': DetectorSpec((385, 775), ()),
+    'HyPix3000(V)': DetectorSpec((775, 385), ()),
+}
+
+
+class CorrectionPipeline(object):
+    """
+        Flat-field, pixel mask, module gap and counting time correction
+        of frames of the detector ``detector`` (key of DETECTORS).
+
+        Inputs:
+            flatfield -- relative sensitivity of each pixel
+            mask      -- boolean array, True for dead or hot pixels
+            gaps      -- index expressions of the module gaps
+                         (default: from DETECTORS)
+            fill      -- value of masked pixels (NaN or 0)
+            dtype     -- floating point type of the corrected frames
+
+        After initialization:
+            .gain     -- combined gain, ``fill`` for masked pixels
+            .mask     -- combined mask of all excluded pixels
+    """
+    def __init__(self, detector, flatfield=None, mask=None, gaps=None,
+                 fill=np.nan, dtype=np.float32):
+        if detector in DETECTORS:
+            spec = DETECTORS[detector]
+        elif flatfield is not None or mask is not None:
+            shape = np.shape(flatfield if flatfield is not None else mask)
+            spec = DetectorSpec(shape, ())
+        else:
+            raise ValueError("Unknown detector: %s" % detector)
+        if gaps is None:
+            gaps = spec.gaps
+        self.detector = detector
+        self.dtype = np.dtype(dtype)
+
+        bad = np.zeros(spec.shape, dtype=bool)
+        gain = np.ones(spec.shape, dtype=self.dtype)
+        if flatfield is not None:
+            flat = np.asarray(flatfield, dtype=self.dtype)
+            valid = np.isfinite(flat) & (flat > 0)
+            np.divide(1, flat, out=gain, where=valid)
+            bad |= ~valid
+        if mask is not None:
+            bad |= np.asarray(mask, dtype=bool)
+        for gap in gaps:
+            bad[gap] = True
+        gain[bad] = fill
+        self.gain = gain
+        self.mask = bad
+
+    def apply(self, frames, count_time=None, out=None):
+        """
+            Returns the corrected frame(s) of the 2D or 3D array ``frames``.
+
+            ``count_time`` is a scalar or one value per frame. ``out`` may be
+            a preallocated array of the pipeline dtype, e.g. ``frames``
+            itself for in-place correction of floating point data.
+        """
+        frames = np.asarray(frames)
+        out = np.multiply(frames, self.gain, out=out, dtype=self.dtype,
+                          casting="unsafe")
+        if count_time is not None:
+            count_time = np.asarray(count_time, dtype=self.dtype)
+            if count_time.ndim:
+                count_time = count_time.reshape((-1,) + (1,) * (out.ndim - 1))
+            out /= count_time
+        return out
+
+    def apply_chunks(self, source, count_time=None, chunksize=32):
+        """
+            Yields corrected chunks of frames of ``source`` (array, memmap
+            or iterator of frames, see reductions.iter_chunks).
+        """
+        start = 0
+        for chunk in iter_chunks(source, chunksize):
+            ctime = count_time
+            if np.ndim(count_time):
+                ctime = count_time[start:start+len(chunk)]
+            start += len(chunk)
+            yield self.apply(chunk, ctime)
+
+
+_pipelines = dict()
+
+
+def _fingerprint(arr):
+    if arr is None:
+        return None
+    arr = np.ascontiguousarray(arr)
+    return arr.shape, arr.dtype.str, hashlib.sha1(arr.view(np.uint8)).digest()
+
+
+def get_pipeline(detector, flatfield=None, mask=None, gaps=None,
+                 fill=np.nan, dtype=np.float32):
+    """
+        Returns a CorrectionPipeline for this configuration, which is
+        only created if it is not cached yet.
+    """
+    key = (detector, _fingerprint(flatfield), _fingerprint(mask),
+           repr(gaps), repr(fill), np.dtype(dtype).str)
+    if key not in _pipelines:
+        _pipelines[key] = CorrectionPipeline(detector, flatfield, mask, gaps,
+                                             fill, dtype)
+    return _pipelines[key]
+
+
+def rasx_detector(rasx):
+    """
+        Name of the detector that recorded the frames of a RASXfile.
+    """
+    if rasx.detector is None:
+        raise ValueError("%s holds no detector frames" % rasx.path)
+    return rasx.detector
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+    Compact storage of stacks of photon counting detector frames.
+
+    Most frames of a reciprocal space map contain few counts. FrameStack
+    stores each frame either dense with the smallest integer type that
+    holds its counts or sparse as flat pixel indices and values, whichever
+    takes less memory:
+
+        stack = FrameStack()
+        for frame in frames:
+            stack.append(frame)
+        stack[3]                      # dense frame
+        stack.roi_sum(np.s_[10:20, 100:200])
+        stack.sum(axis=0)             # without densifying the stack
+"""
+
+import operator
+import numpy as np
+
+
+def smallest_dtype(frame):
+    """
+        Smallest unsigned integer type holding all values of ``frame``.
+        Other frames keep their type.
+    """
+    if frame.dtype.kind not in "ui" or not frame.size:
+        return frame.dtype
+    if frame.min() < 0:
+        return frame.dtype
+    vmax = frame.max()
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if vmax <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return frame.dtype
+
+
+class SparseFrame(object):
+    """
+        Frame stored as flat indices and values of its nonzero pixels.
+    """
+    __slots__ = ("indices", "values")
+
+    def __init__(self, indices, values):
+        self.indices = indices
+        self.values = values
+
+    @property
+    def nbytes(self):
+        return self.indices.nbytes + self.values.nbytes
+
+
+def compress(frame):
+    """
+        Returns the more compact representation of ``frame``: a downcast
+        dense array or a SparseFrame.
+    """
+    dtype = smallest_dtype(frame)
+    flat = frame.ravel()
+    indices = np.flatnonzero(flat)
+    itype = np.uint32 if flat.size <= 2**32 else np.uint64
+    sparse_nbytes = len(indices) * (np.dtype(itype).itemsize + dtype.itemsize)
+    if sparse_nbytes < flat.size * dtype.itemsize:
+        return SparseFrame(indices.astype(itype), flat[indices].astype(dtype))
+    return frame.astype(dtype)
+
+
+class FrameStack(object):
+    """
+        Stack of equally shaped frames, each stored in its most compact
+        representation (see ``compress``).
+
+        Indexing with an integer returns the dense frame in the original
+        type, indexing with a slice, index array or boolean mask returns
+        a FrameStack sharing the storage. Tuples index like the dense 3D
+        array. ``np.asarray(stack)`` densifies the whole stack.
+    """
+    ndim = 3
+
+    def __init__(self, frames=(), dtype=None):
+        self._frames = []
+        self.frame_shape = None
+        self.dtype = dtype
+        self.extend(frames)
+
+    def append(self, frame):
+        frame = np.asarray(frame)
+        if self.frame_shape is None:
+            self.frame_shape = frame.shape
+            if self.dtype is None:
+                self.dtype = frame.dtype
+        elif frame.shape != self.frame_shape:
+            raise ValueError("Frame of shape %s does not match %s"
+                             % (frame.shape, self.frame_shape))
+        self._frames.append(compress(frame))
+
+    def extend(self, frames):
+        for frame in frames:
+            self.append(frame)
+
+    def __len__(self):
+        return len(self._frames)
+
+    @property
+    def shape(self):
+        return (len(self),) + tuple(self.frame_shape or ())
+
+    @property
+    def nbytes(self):
+        return sum(frame.nbytes for frame in self._frames)
+
+    def _subset(self, frames):
+        subset = FrameStack(dtype=self.dtype)
+        subset.frame_shape = self.frame_shape
+        subset._frames = frames
+        return subset
+
+    def _dense(self, frame):
+        if isinstance(frame, SparseFrame):
+            out = np.zeros(self.frame_shape, dtype=self.dtype)
+            out.ravel()[frame.indices] = frame.values
+            return out
+        return frame.astype(self.dtype)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, tuple):
+            if not idx:
+                return np.asarray(self)
+            selected = self[idx[0]]
+            if isinstance(selected, FrameStack):
+                # pixel indices apply to each selected frame
+                if not len(selected):
+                    empty = np.empty((0,) + self.frame_shape, dtype=self.dtype)
+                    return empty[(slice(None),) + idx[1:]]
+                return np.stack([frame[idx[1:]] for frame in selected])
+            return selected[idx[1:]]
+        if isinstance(idx, slice):
+            return self._subset(self._frames[idx])
+        if np.ndim(idx):
+            idx = np.asarray(idx)
+            if idx.dtype == bool:
+                if idx.shape != (len(self),):
+                    raise IndexError("Boolean mask of shape %s does not match "
+                                     "%i frames" % (idx.shape, len(self)))
+                idx = np.flatnonzero(idx)
+            return self._subset([self._frames[i] for i in idx])
+        return self._dense(self._frames[idx])
+
+    def __iter__(self):
+        for frame in self._frames:
+            yield self._dense(frame)
+
+    def __array__(self, dtype=None, copy=None):
+        out = np.empty(self.shape, dtype=self.dtype if dtype is None else dtype)
+        for i, frame in enumerate(self):
+            out[i] = frame
+        return out
+
+    def _roi_mask(self, frame, roi):
+        indices = frame.indices.astype(np.intp)
+        rows, cols = np.divmod(indices, self.frame_shape[1])
+        mask = np.ones(len(rows), dtype=bool)
+        for coords, sl, size in zip((rows, cols), roi, self.frame_shape):
+            if not isinstance(sl, slice):
+                i = operator.index(sl)
+                if not -size <= i < size:
+                    raise IndexError("index %i is out of bounds for size %i"
+                                     % (i, size))
+                sl = slice(i % size, i % size + 1)
+            start, stop, step = sl.indices(size)
+            if step > 0:
+                mask &= (coords >= start) & (coords < stop)
+            else:
+                mask &= (coords <= start) & (coords > stop)
+            if step not in (1, -1):
+                mask &= (coords - start) % step == 0
+        return mask
+
+    def roi_sum(self, roi):
+        """
+            Returns the sum of the counts inside ``roi`` (tuple of two
+            slices or integers, e.g. np.s_[y1:y2, x1:x2]) for each frame.
+        """
+        out = np.zeros(len(self), dtype=np.uint64 if self.dtype.kind == "u"
+                                                  else np.float64)
+        for i, frame in enumerate(self._frames):
+            if isinstance(frame, SparseFrame):
+                out[i] = frame.values[self._roi_mask(frame, roi)].sum()
+            else:
+                out[i] = frame[roi].sum()
+        return out
+
+    def sum(self, axis=0):
+        """
+            Projections without densifying the stack:
+                axis=0: sum of all frames (2D)
+                axis=1: sum over the rows of each frame (frames x columns)
+                axis=2: sum over the columns of each frame (frames x rows)
+        """
+        acctype = np.uint64 if self.dtype.kind == "u" else np.float64
+        nrows, ncols = self.frame_shape
+        if axis == 0:
+            out = np.zeros(self.frame_shape, dtype=acctype)
+            flat = out.ravel()
+            for frame in self._frames:
+                if isinstance(frame, SparseFrame):
+                    flat[frame.indices] += frame.values # indices are unique
+                else:
+                    out += frame
+            return out
+        length = ncols if axis == 1 else nrows
+        out = np.zeros((len(self), length), dtype=acctype)
+        for i, frame in enumerate(self._frames):
+            if isinstance(frame, SparseFrame):
+                coords = frame.indices % ncols if axis == 1 \
+                                               else frame.indices // ncols
+                out[i] = np.bincount(coords, frame.values, minlength=length)
+            else:
+                out[i] = frame.sum(axis=axis - 1, dtype=acctype)
+        return out
+
+    def max(self, axis=0):
+        """
+            Maximum projection over all frames.
+        """
+        if axis != 0:
+            raise ValueError("Only the projection along the frames is supported")
+        out = np.zeros(self.frame_shape, dtype=self.dtype)
+        flat = out.ravel()
+        for frame in self._frames:
+            if isinstance(frame, SparseFrame):
+                flat[frame.indices] = np.maximum(flat[frame.indices],
+                                                 frame.values)
+            else:
+                np.maximum(out, frame, out=out, casting="unsafe")
+        return out
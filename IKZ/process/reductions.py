@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+    Chunked reductions of detector frame stacks.
+
+    The frames can come from an in-memory array, a memmap or any iterator
+    of frames (2D) or chunks of frames (3D). They are reduced in chunks of
+    fixed size across a pool of threads without upcasting the whole stack:
+
+        stats = reduce_stack(rasx.images, chunksize=32)
+        stats.sum, stats.mean, stats.std, stats.max
+
+    Mean and variance are accumulated with Welford's algorithm and merged
+    between chunks with the parallel formula of Chan et al.
+"""
+
+import os
+import numpy as np
+from concurrent import futures
+
+
+def iter_chunks(source, chunksize=32):
+    """
+        Yields chunks (3D arrays) of at most ``chunksize`` frames from an
+        array of frames or an iterator of frames or chunks.
+    """
+    if hasattr(source, "shape") and np.ndim(source) == 3:
+        for start in range(0, len(source), chunksize):
+            yield source[start:start+chunksize]
+        return
+    frames = []
+    for item in source:
+        item = np.asarray(item)
+        if item.ndim == 3:
+            if frames:
+                yield np.stack(frames)
+                frames = []
+            yield item
+            continue
+        frames.append(item)
+        if len(frames) == chunksize:
+            yield np.stack(frames)
+            frames = []
+    if frames:
+        yield np.stack(frames)
+
+
+def _sum_dtype(dtype):
+    """
+        Accumulator type for sums that does not overflow for counts.
+    """
+    kind = np.dtype(dtype).kind
+    if kind == "u":
+        return np.uint64
+    elif kind in "ib":
+        return np.int64
+    return np.float64
+
+
+class StackStatistics(object):
+    """
+        Streaming per-pixel statistics of a stack of frames.
+
+        Available after adding frames:
+            .count  - number of frames
+            .sum    - sum (accumulated in 64 bit)
+            .mean   - mean (in ``dtype``)
+            .var    - variance (in ``dtype``)
+            .std    - standard deviation
+            .max    - maximum projection (in the type of the frames)
+            .min    - minimum projection (in the type of the frames)
+    """
+    def __init__(self, dtype=np.float64):
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self.sum = None
+        self.mean = None
+        self.m2 = None
+        self.max = None
+        self.min = None
+
+    def add(self, chunk):
+        """
+            Adds the frames of the 3D array ``chunk``.
+        """
+        if not len(chunk):
+            return self
+        if self.count == 0:
+            shape = chunk.shape[1:]
+            self.sum = np.zeros(shape, dtype=_sum_dtype(chunk.dtype))
+            self.mean = np.zeros(shape, dtype=self.dtype)
+            self.m2 = np.zeros(shape, dtype=self.dtype)
+            self.max = chunk[0].copy()
+            self.min = chunk[0].copy()
+        np.add(self.sum, chunk.sum(axis=0, dtype=self.sum.dtype), out=self.sum)
+        np.maximum(self.max, chunk.max(axis=0), out=self.max)
+        np.minimum(self.min, chunk.min(axis=0), out=self.min)
+
+        delta = np.empty_like(self.mean)
+        tmp = np.empty_like(self.mean)
+        for frame in chunk:
+            self.count += 1
+            np.subtract(frame, self.mean, out=delta, casting="unsafe")
+            np.divide(delta, self.count, out=tmp)
+            self.mean += tmp
+            np.subtract(frame, self.mean, out=tmp, casting="unsafe")
+            tmp *= delta
+            self.m2 += tmp
+        return self
+
+    def merge(self, other):
+        """
+            Combines the statistics of ``other`` into this instance.
+        """
+        if not other.count:
+            return self
+        if not self.count:
+            self.__dict__.update(other.__dict__)
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2
+        self.m2 += delta**2 * (self.count * other.count / count)
+        self.mean += delta * (other.count / count)
+        self.sum += other.sum
+        np.maximum(self.max, other.max, out=self.max)
+        np.minimum(self.min, other.min, out=self.min)
+        self.count = count
+        return self
+
+    @property
+    def var(self):
+        return self.m2 / self.count
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+
+def reduce_stack(source, chunksize=32, workers=None, dtype=np.float64):
+    """
+        Computes the StackStatistics of all frames of ``source`` (array,
+        memmap or iterator of frames) in chunks of ``chunksize`` frames
+        using a pool of ``workers`` threads.
+
+        ``dtype`` is the accumulator type of mean and variance.
+    """
+    result = StackStatistics(dtype)
+    reduce_chunk = lambda chunk: StackStatistics(dtype).add(np.asarray(chunk))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    maxpending = 2 * workers
+    with futures.ThreadPoolExecutor(workers) as pool:
+        pending = []
+        for chunk in iter_chunks(source, chunksize):
+            pending.append(pool.submit(reduce_chunk, chunk))
+            if len(pending) >= maxpending:
+                result.merge(pending.pop(0).result())
+        for job in pending:
+            result.merge(job.result())
+    return result
+
+
+def hot_pixels(stats, nsigma=10., size=3):
+    """
+        Returns a boolean mask of hot pixels, i.e. pixels whose mean
+        exceeds the median of the surrounding ``size`` x ``size`` pixels
+        by more than ``nsigma`` times the expected Poisson noise.
+
+        ``stats`` is either a StackStatistics instance or a frame source
+        passed to reduce_stack.
+    """
+    from scipy import ndimage
+    if not isinstance(stats, StackStatistics):
+        stats = reduce_stack(stats)
+    mean = stats.mean
+    local = ndimage.median_filter(mean, size=size)
+    noise = np.sqrt(np.maximum(local, 1) / stats.count)
+    return (mean - local) > nsigma * noise
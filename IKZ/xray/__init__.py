@@ -5,6 +5,10 @@ Created on Wed May  8 13:44:32 2019
 @author: richter
 """
 
+from .._lazy import lazy_submodules
 
-from . import io
-from . import geometry
\ No newline at end of file
+# submodules are imported on first access to keep the import fast
+_submodules = ("io", "geometry", "catalogue", "export", "kinematics",
+               "batch")
+
+__getattr__, __dir__ = lazy_submodules(__name__, _submodules)
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+    Batch reduction of many measurement files.
+
+    A recipe (json file) defines the reductions done for every .rasx,
+    .brml and .fio file:
+
+        {
+         "roi":         {"peak": [y1, y2, x1, x2]},
+         "projections": ["sum", "max", "rows", "columns"],
+         "profiles":    {"cut": [y0, x0, y1, x1, num]},
+         "convert":     true
+        }
+
+    ``roi`` sums the counts inside the rectangles for each frame,
+    ``projections`` are the sum and maximum of all frames and the sums
+    over the rows or columns of each frame, ``profiles`` are line profiles
+    of ``num`` points through each frame and ``convert`` stores the data
+    table and frames of the file. Frame reductions are skipped for files
+    without detector frames, the data table for files without one (e.g.
+    .rasx files with detector frames only).
+
+    The results of each file are written to one HDF5 file in the output
+    directory:
+
+        ikz_batch_reduce recipe.json "/data/beamtime/*.rasx" -o reduced
+
+    Outputs appear atomically. A manifest in the output directory records
+    the finished files, so that an interrupted run only processes the
+    remaining or modified files when it is started again.
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import logging
+import argparse
+import numpy as np
+from concurrent import futures
+
+from . import io
+
+
+MANIFEST = "manifest.json"
+
+logger = logging.getLogger(__name__)
+
+
+def load_recipe(recipe):
+    """
+        Returns the recipe dictionary from a json file, json string or
+        dictionary.
+    """
+    if isinstance(recipe, dict):
+        return recipe
+    if os.path.isfile(recipe):
+        with open(recipe, "r") as fh:
+            return json.load(fh)
+    return json.loads(recipe)
+
+
+def recipe_hash(recipe):
+    return hashlib.sha1(json.dumps(recipe, sort_keys=True).encode()).hexdigest()
+
+
+def find_files(patterns):
+    """
+        Returns the sorted list of measurement files in the given
+        directories (recursively) or matching the given glob patterns.
+    """
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for dirpath, dirnames, filenames in os.walk(pattern):
+                found.update(os.path.join(dirpath, fname)
+                             for fname in filenames)
+        else:
+            found.update(glob.glob(pattern, recursive=True))
+    return sorted(os.path.abspath(path) for path in found
+                  if os.path.splitext(path)[1].lower() in io.readers)
+
+
+def _frames(obj):
+    images = getattr(obj, "images", None)
+    if images is None or not len(images):
+        return None
+    return images
+
+
+def line_profile(frame, line):
+    """
+        Linearly interpolated values of ``frame`` along the line
+        [y0, x0, y1, x1, num].
+    """
+    from scipy import ndimage
+    y0, x0, y1, x1, num = line
+    coords = np.array([np.linspace(y0, y1, int(num)),
+                       np.linspace(x0, x1, int(num))])
+    return ndimage.map_coordinates(np.asarray(frame, dtype=float), coords,
+                                   order=1)
+
+
+def reduce_frames(images, recipe):
+    """
+        Returns a dictionary {dataset name: array} of the frame
+        reductions of ``recipe`` for a stack of frames (3D array or
+        FrameStack).
+    """
+    results = dict()
+    for name, (y1, y2, x1, x2) in recipe.get("roi", {}).items():
+        roi = np.s_[int(y1):int(y2), int(x1):int(x2)]
+        if hasattr(images, "roi_sum"):
+            results["roi/" + name] = images.roi_sum(roi)
+        else:
+            results["roi/" + name] = images[(slice(None),) + roi].sum((1, 2))
+    for name in recipe.get("projections", ()):
+        if name == "max":
+            results["projections/max"] = images.max(axis=0)
+        else:
+            axis = ("sum", "rows", "columns").index(name)
+            results["projections/" + name] = images.sum(axis=axis)
+    for name, line in recipe.get("profiles", {}).items():
+        results["profiles/" + name] = np.array([line_profile(frame, line)
+                                                for frame in images])
+    return results
+
+
+def write_results(outpath, results, source):
+    """
+        Writes the datasets ``results`` (name: array or iterator of
+        frames) to the HDF5 file ``outpath`` via a temporary file, so
+        that the output appears completely or not at all.
+    """
+    import h5py
+    tmppath = "%s.tmp%i" % (outpath, os.getpid())
+    try:
+        with h5py.File(tmppath, "w") as h5:
+            h5.attrs["source"] = source
+            for name, data in results.items():
+                if name == "frames":
+                    dset = h5.create_dataset(name, shape=data.shape,
+                                             dtype=data.dtype,
+                                             chunks=(1,) + data.shape[1:],
+                                             compression="gzip")
+                    for i, frame in enumerate(data):
+                        dset[i] = frame
+                else:
+                    h5.create_dataset(name, data=np.asarray(data))
+        os.replace(tmppath, outpath)
+    finally:
+        if os.path.exists(tmppath):
+            os.remove(tmppath)
+    return outpath
+
+
+def reduce_file(path, outpath, recipe):
+    """
+        Applies ``recipe`` to the measurement file ``path`` and stores
+        the results in the HDF5 file ``outpath``.
+    """
+    from .export import table
+    kwargs = dict(verbose=False)
+    if path.lower().endswith(".rasx"):
+        kwargs["frames"] = "adaptive"
+    obj = io.load(path, **kwargs)
+    images = _frames(obj)
+    results = dict()
+    if images is not None:
+        results.update(reduce_frames(images, recipe))
+    if recipe.get("convert"):
+        names, columns = table(obj) # empty without profiles
+        for name, column in zip(names, columns):
+            results["data/" + name.replace("/", "_")] = column
+        if images is not None:
+            results["frames"] = images
+    return write_results(outpath, results, path)
+
+
+def _output_path(path, outdir):
+    base = os.path.splitext(os.path.basename(path))[0]
+    # files of equal name from different folders get distinct outputs
+    tag = hashlib.sha1(os.path.dirname(path).encode()).hexdigest()[:8]
+    return os.path.join(outdir, "%s_%s.h5" % (base, tag))
+
+
+class Manifest(object):
+    """
+        Record of the processed files of an output directory as json file.
+        Entries hold the output file name, modification time and size of the
+        input and the recipe hash, or the error message of failed files.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = dict()
+        if os.path.isfile(path):
+            with open(path, "r") as fh:
+                self.entries = json.load(fh)
+
+    def done(self, path, rhash):
+        """
+            Returns True if ``path`` was processed with the recipe
+            ``rhash`` and has not been modified since.
+        """
+        entry = self.entries.get(path)
+        if entry is None or "error" in entry:
+            return False
+        stat = os.stat(path)
+        return entry["mtime"] == stat.st_mtime \
+               and entry["size"] == stat.st_size \
+               and entry["recipe"] == rhash \
+               and os.path.isfile(os.path.join(os.path.dirname(self.path),
+                                               entry["output"]))
+
+    def add(self, path, **entry):
+        stat = os.stat(path)
+        entry.update(mtime=stat.st_mtime, size=stat.st_size)
+        self.entries[path] = entry
+        self.save()
+
+    def save(self):
+        tmpfile = self.path + ".tmp"
+        with open(tmpfile, "w") as fh:
+            json.dump(self.entries, fh, indent=1)
+        os.replace(tmpfile, self.path)
+
+
+def run(paths, recipe, outdir, workers=None, force=False):
+    """
+        Reduces all files ``paths`` with ``recipe`` using a pool of
+        ``workers`` processes and writes the results to ``outdir``.
+        Files already processed according to the manifest are skipped
+        unless ``force`` is True.
+
+        Returns the Manifest.
+    """
+    recipe = load_recipe(recipe)
+    rhash = recipe_hash(recipe)
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    manifest = Manifest(os.path.join(outdir, MANIFEST))
+    todo = [path for path in paths if force or not manifest.done(path, rhash)]
+    logger.info("%i of %i files to process", len(todo), len(paths))
+
+    with futures.ProcessPoolExecutor(workers) as pool:
+        jobs = dict()
+        for path in todo:
+            job = pool.submit(reduce_file, path, _output_path(path, outdir),
+                              recipe)
+            jobs[job] = (path, time.time())
+        for i, job in enumerate(futures.as_completed(jobs)):
+            path, t0 = jobs[job]
+            try:
+                output = job.result()
+            except Exception as err:
+                message = "%s: %s" % (type(err).__name__, err)
+                manifest.add(path, error=message, recipe=rhash)
+                logger.error("%s failed: %s", path, message)
+                continue
+            manifest.add(path, output=os.path.basename(output), recipe=rhash)
+            logger.info("[%i/%i] %s -> %s (%.1f s)", i + 1, len(todo), path,
+                        os.path.basename(output), time.time() - t0)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recipe", help="json file or string of the recipe")
+    parser.add_argument("inputs", nargs="+",
+                        help="directories or glob patterns of the files")
+    parser.add_argument("-o", "--outdir", default="reduced",
+                        help="output directory (default: %(default)s)")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="number of processes (default: all cpus)")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="reprocess files listed in the manifest")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="log the loading statistics of each file")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if not args.verbose:
+        io.logger.setLevel(logging.WARNING)
+
+    paths = find_files(args.inputs)
+    manifest = run(paths, args.recipe, args.outdir, args.workers, args.force)
+    failed = [path for path in paths
+                   if "error" in manifest.entries.get(path, {})]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
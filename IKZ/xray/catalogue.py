@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+    Fast catalogue of directories of measurement files.
+
+    Only the headers of the .rasx, .brml and .fio files are read, which
+    is much faster than loading them with RASXfile, BRMLfile or FIOdata.
+    The catalogue can be persisted to a json index so that subsequent
+    scans only read new or modified files:
+
+        cat = Catalogue("index.json")
+        cat.scan("/data/beamtime")
+        for entry in cat.select(sample="GaN"):
+            print(entry["path"], entry["axis"], entry["points"])
+"""
+
+import os
+import re
+import json
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent import futures
+
+from . import io
+
+
+def _starttime_seconds(starttime, fmt):
+    try:
+        return time.mktime(time.strptime(starttime, fmt))
+    except (ValueError, TypeError):
+        return None
+
+
+def rasx_header(path):
+    """
+        Reads the scan and sample information of the first frame of a
+        Rigaku .rasx file.
+    """
+    with zipfile.ZipFile(path) as fh:
+        names = fh.namelist()
+        metafiles = [name for name in names if "MesurementConditions" in name]
+        content = fh.read(metafiles[0])
+    sections = io.RASXMetaParser().sections(content) or dict()
+    info = dict()
+    for group in ("ScanInformation", "SampleInformation"):
+        if group in sections:
+            info[group] = io._parse_info(ET.fromstring(sections[group]))
+    scaninfo = info.get("ScanInformation", {})
+    sampleinfo = info.get("SampleInformation", {})
+    starttime = scaninfo.get("StartTime")
+    return dict(starttime=starttime,
+                startsec=_starttime_seconds(starttime, "%Y-%m-%dT%H:%M:%SZ"),
+                axis=scaninfo.get("AxisName"),
+                sample=sampleinfo.get("SampleName"),
+                points=None,
+                profiles=sum("Profile" in name for name in names),
+                frames=sum("Image" in name for name in names))
+
+
+_brml_scaninfo = re.compile(br"<ScanInformation\b.*?</ScanInformation>", re.S)
+_brml_tag = lambda tag: re.compile(br"<%s>([^<]*)</%s>" % (tag, tag))
+_brml_starttime = _brml_tag(b"TimeStampStarted")
+_brml_sample = _brml_tag(b"SampleName")
+
+
+def brml_header(path, exp_nbr=0, encoding="utf-8"):
+    """
+        Reads the scan information of the first raw data file of a
+        Bruker .brml file.
+    """
+    with zipfile.ZipFile(path) as fh:
+        experiment = "Experiment%i" % exp_nbr
+        container = fh.read("%s/DataContainer.xml" % experiment)
+        rawlist = re.findall(br"<string>([^<]*)</string>", container)
+        content = fh.read(rawlist[0].decode(encoding))
+
+    scaninfo = ET.fromstring(_brml_scaninfo.search(content).group(0))
+    axes = [axis.attrib["AxisName"] for axis in scaninfo.iter("ScanAxisInfo")]
+    starttime = _brml_starttime.search(content)
+    sample = _brml_sample.search(content) or _brml_sample.search(container)
+    if starttime is not None:
+        starttime = starttime.group(1).decode(encoding)
+    return dict(starttime=starttime,
+                startsec=_starttime_seconds(starttime and starttime[:19],
+                                            "%Y-%m-%dT%H:%M:%S"),
+                axis=", ".join(axes) or scaninfo.get("ScanName"),
+                sample=sample and sample.group(1).decode(encoding),
+                points=int(scaninfo.findtext("MeasurementPoints")),
+                profiles=len(rawlist),
+                frames=None)
+
+
+def fio_header(path):
+    """
+        Reads comment and parameters of a .fio file and counts the data
+        lines.
+    """
+    with open(path, "r") as fh:
+        comment, parameters, colname, line = io.read_fio_header(fh)
+        points = 0
+        while line:
+            if line.strip() and not line.startswith("!"):
+                points += 1
+            line = fh.readline()
+    words = comment.split()
+    try:
+        starttime = time.strftime("%Y-%m-%dT%H:%M:%S",
+                                  io.parse_fio_times(comment)[0])
+    except Exception:
+        starttime = None
+    return dict(starttime=starttime,
+                startsec=_starttime_seconds(starttime, "%Y-%m-%dT%H:%M:%S"),
+                axis=words[1] if len(words) > 1 else None,
+                sample=parameters.get("sample"),
+                points=points,
+                profiles=None,
+                frames=None)
+
+
+header_readers = {".rasx": rasx_header,
+                  ".brml": brml_header,
+                  ".fio": fio_header}
+
+
+def read_header(path):
+    """
+        Returns the catalogue entry of a single measurement file.
+        Errors are stored in the entry instead of being raised.
+    """
+    stat = os.stat(path)
+    ext = os.path.splitext(path)[1].lower()
+    entry = dict(path=path,
+                 format=ext[1:],
+                 mtime=stat.st_mtime,
+                 size=stat.st_size)
+    try:
+        entry.update(header_readers[ext](path))
+    except Exception as err:
+        entry["error"] = "%s: %s" % (type(err).__name__, err)
+    return entry
+
+
+class Catalogue(object):
+    """
+        Index of the measurement files found in one or more directory
+        trees.
+
+        The entries are dictionaries with the keys:
+            path, format, mtime, size, starttime, startsec, axis, sample,
+            points, profiles, frames
+        and ``error`` if the header could not be read.
+
+        If ``indexfile`` is given, the index is loaded from and saved to
+        this json file and only new or modified files are read on
+        subsequent scans.
+    """
+    def __init__(self, indexfile=None):
+        self.indexfile = indexfile
+        self.entries = dict()
+        if indexfile is not None and os.path.isfile(indexfile):
+            with open(indexfile, "r") as fh:
+                self.entries = json.load(fh)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(sorted(self.entries.values(),
+                           key=lambda entry: (entry.get("startsec") or 0,
+                                              entry["path"])))
+
+    def scan(self, root, workers=None, processes=False):
+        """
+            Searches ``root`` recursively for measurement files and reads
+            the headers of all files that are new or were modified since
+            the last scan using a pool of ``workers`` threads or, if
+            ``processes`` is True, processes.
+
+            Returns the number of (re-)read files.
+        """
+        root = os.path.abspath(root)
+        found = dict()
+        for dirpath, dirnames, filenames in os.walk(root):
+            for fname in filenames:
+                if os.path.splitext(fname)[1].lower() in header_readers:
+                    path = os.path.join(dirpath, fname)
+                    found[path] = os.stat(path)
+
+        for path in list(self.entries):
+            if path.startswith(root + os.sep) and path not in found:
+                self.entries.pop(path)
+
+        stale = []
+        for path, stat in found.items():
+            entry = self.entries.get(path)
+            if entry is None or entry["mtime"] != stat.st_mtime \
+                             or entry["size"] != stat.st_size:
+                stale.append(path)
+
+        if stale:
+            Executor = futures.ProcessPoolExecutor if processes \
+                                                   else futures.ThreadPoolExecutor
+            with Executor(workers) as pool:
+                for entry in pool.map(read_header, stale):
+                    self.entries[entry["path"]] = entry
+
+        if self.indexfile is not None:
+            self.save()
+        return len(stale)
+
+    def save(self, indexfile=None):
+        """
+            Writes the index to ``indexfile`` (default: self.indexfile).
+        """
+        indexfile = self.indexfile if indexfile is None else indexfile
+        tmpfile = indexfile + ".tmp"
+        with open(tmpfile, "w") as fh:
+            json.dump(self.entries, fh, indent=1)
+        os.replace(tmpfile, indexfile)
+
+    def select(self, **criteria):
+        """
+            Returns all entries matching the given criteria, e.g.
+            ``select(format="rasx", sample="GaN")``.
+        """
+        return [entry for entry in self
+                      if all(entry.get(key) == val
+                             for key, val in criteria.items())]
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+    Export of FIOdata, RASXfile and BRMLfile data to text or binary
+    tables.
+
+    The rows are written in chunks directly to the output file, so that
+    no string of the complete table is built in memory:
+
+        export(FIOdata("scan_00001.fio"), "scan_00001.dat")
+        export(RASXfile("rsm.rasx"), "rsm.npy")
+
+    Many files are converted concurrently by ``convert_files``.
+"""
+
+import os
+import numpy as np
+from concurrent import futures
+
+from . import io
+
+
+def table(obj):
+    """
+        Returns the column names and the list of 1D column arrays of a
+        FIOdata, RASXfile or BRMLfile instance. Both lists are empty if
+        there are no tabular data, e.g. for a .rasx file holding only
+        detector frames.
+    """
+    if isinstance(obj, io.FIOdata):
+        names = list(obj.colname)
+        columns = [obj[name] for name in names]
+    elif isinstance(obj, io.RASXfile):
+        if not len(obj.data):
+            return [], []
+        rsm = obj.get_RSM(flat=True)
+        offsets = rsm.pop("offsets")
+        profile = np.arange(len(offsets) - 1)
+        names = ["Profile"]
+        columns = [io.expand_rows(profile, offsets)]
+        for name, values in rsm.items():
+            if not np.ndim(values):
+                continue # constant motors
+            if len(values) != offsets[-1]:
+                values = io.expand_rows(values, offsets)
+            names.append(name)
+            columns.append(values)
+    elif isinstance(obj, io.BRMLfile):
+        arrays = dict((key, val) for (key, val) in obj.data.items()
+                                 if np.ndim(val) and val.dtype.kind in "iuf")
+        if not arrays:
+            return [], []
+        shapes = [val.shape for val in arrays.values()]
+        shape = max(set(shapes), key=shapes.count)
+        names, columns = [], []
+        for key, val in arrays.items():
+            if val.shape == shape:
+                columns.append(val.ravel())
+            elif len(shape) == 2 and val.shape == shape[:1]:
+                # per frame motors, e.g. the stepped drives of a map
+                columns.append(np.repeat(val, shape[1]))
+            else:
+                continue
+            names.append(key)
+    else:
+        raise TypeError("Cannot export object of type %s" % type(obj).__name__)
+    return names, columns
+
+
+def row_format(fmt, numcols, delimiter=" "):
+    """
+        Format string of one row of ``numcols`` columns.
+    """
+    if not isinstance(fmt, str):
+        fmt = list(fmt)
+        if len(fmt) != numcols:
+            raise ValueError("fmt has %i formats for %i columns"
+                             % (len(fmt), numcols))
+        return delimiter.join(fmt)
+    count = fmt.count("%")
+    if count == 1:
+        return delimiter.join([fmt] * numcols)
+    elif count != numcols:
+        raise ValueError("fmt has wrong number of %% formats: %s" % fmt)
+    return fmt
+
+
+def write_text(fh, names, columns, delimiter=" ", fmt="%.18e",
+               chunksize=65536):
+    """
+        Writes the columns as text with one header line holding the
+        column ``names`` to the file handle or path ``fh``.
+
+        As for numpy.savetxt, ``fmt`` is a single format for all columns,
+        a sequence of formats or a string with one format per column.
+    """
+    if isinstance(fh, str):
+        with open(fh, "w") as fh:
+            return write_text(fh, names, columns, delimiter, fmt, chunksize)
+    fh.write(delimiter.join(names) + "\n")
+    if not len(columns):
+        return
+    rowfmt = row_format(fmt, len(columns), delimiter) + "\n"
+    numrows = len(columns[0])
+    for start in range(0, numrows, chunksize):
+        block = np.column_stack([col[start:start+chunksize] for col in columns])
+        fh.write((rowfmt * len(block)) % tuple(block.ravel()))
+
+
+def write_npy(path, names, columns, chunksize=1048576):
+    """
+        Writes the columns to a .npy file holding a structured array with
+        one field per column.
+    """
+    dtype = np.dtype([(str(name), col.dtype) for (name, col)
+                                             in zip(names, columns)])
+    numrows = len(columns[0]) if len(columns) else 0
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=dtype,
+                                    shape=(numrows,))
+    for start in range(0, numrows, chunksize):
+        stop = start + chunksize
+        for name, col in zip(dtype.names, columns):
+            out[name][start:stop] = col[start:stop]
+    out.flush()
+    del out
+
+
+def export(obj, path, **kwargs):
+    """
+        Exports a FIOdata, RASXfile or BRMLfile instance to ``path``.
+
+        The format is chosen by the file extension: ``.npy`` writes a
+        structured binary array, everything else text (see write_text for
+        the keyword arguments).
+    """
+    names, columns = table(obj)
+    if not names:
+        raise ValueError("No tabular data to export to %s" % path)
+    if path.lower().endswith(".npy"):
+        write_npy(path, names, columns, **kwargs)
+    else:
+        write_text(path, names, columns, **kwargs)
+    return path
+
+
+def _convert(path, outpath, kwargs):
+    return export(io.load(path, verbose=False), outpath, **kwargs)
+
+
+def convert_files(paths, outdir=None, ext=".dat", workers=None, **kwargs):
+    """
+        Converts many measurement files concurrently using a pool of
+        ``workers`` processes.
+
+        The outputs are named like the inputs with extension ``ext`` and
+        stored in ``outdir`` (default: next to the inputs).
+
+        Returns the list of written files.
+    """
+    jobs = []
+    for path in paths:
+        base = os.path.splitext(os.path.basename(path))[0] + ext
+        folder = os.path.dirname(path) if outdir is None else outdir
+        jobs.append((path, os.path.join(folder, base)))
+    with futures.ProcessPoolExecutor(workers) as pool:
+        results = [pool.submit(_convert, path, outpath, kwargs)
+                   for (path, outpath) in jobs]
+        return [result.result() for result in results]
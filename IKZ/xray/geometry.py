@@ -1,6 +1,7 @@
 import collections
-import xrayutilities as xu
-from xrayutilities import experiment
+import numpy as np
+
+from . import kinematics
 
 class EmptyGeometry(object):
     """
@@ -14,6 +15,15 @@ class EmptyGeometry(object):
     usemotors = set()
     
     inc_beam = [1,0,0]
+
+    def __new__(cls, *args, **kwargs):
+        # each instance gets its own axis tables. The class attributes
+        # would otherwise be shared and mixed up between all geometries.
+        self = super(EmptyGeometry, cls).__new__(cls)
+        self.sample_rot = collections.OrderedDict()
+        self.detector_rot = collections.OrderedDict()
+        self.offsets = collections.defaultdict(float)
+        return self
     
     def __init__(self, **kwargs):
         """
@@ -27,16 +37,93 @@ class EmptyGeometry(object):
         for motor in kwargs:
             usemotors.add(motor) if kwargs[motor] else usemotors.discard(motor)
         
+    def get_axes(self):
+        """
+            Returns the names and axes of the used sample and detector
+            motors (outer to inner) as two lists of (motor, axis) tuples.
+        """
+        sample_ax = [(mot, ax) for (mot, ax) in self.sample_rot.items() if mot in self.usemotors]
+        detector_ax = [(mot, ax) for (mot, ax) in self.detector_rot.items() if mot in self.usemotors]
+        return sample_ax, detector_ax
+
     def getQconversion(self, inc_beam = None):
+        from xrayutilities import experiment
         if inc_beam is None:
             inc_beam = self.inc_beam
 
-        sample_ax = [ax for (mot, ax) in self.sample_rot.items() if mot in self.usemotors]
-        detector_ax = [ax for (mot, ax) in self.detector_rot.items() if mot in self.usemotors]
-
-        qc = experiment.QConversion(sample_ax, detector_ax, inc_beam)
+        sample_ax, detector_ax = self.get_axes()
+        qc = experiment.QConversion([ax for (mot, ax) in sample_ax],
+                                    [ax for (mot, ax) in detector_ax],
+                                    inc_beam)
         return qc
+
+    def angles_to_Q(self, wavelength=None, energy=8048., dtype=np.float64,
+                    chunksize=65536, workers=None, **angles):
+        """
+            Momentum transfer Q in the sample frame for arrays of motor
+            positions (in degree) given as keyword arguments. Used motors
+            that are not given are set to zero, offsets are subtracted.
+
+            This is a vectorized equivalent of
+                self.getQconversion()(*angles, wl=wavelength)
+            see kinematics.q_vectors for the other inputs.
+
+            Returns an array of shape (N, 3).
+        """
+        sample_ax, detector_ax = self.get_axes()
+        positions = lambda axes: [np.asarray(angles.get(mot, 0.))
+                                  - self.offsets[mot] for (mot, ax) in axes]
+        return kinematics.q_vectors([ax for (mot, ax) in sample_ax],
+                                    [ax for (mot, ax) in detector_ax],
+                                    positions(sample_ax),
+                                    positions(detector_ax),
+                                    wavelength, energy, self.inc_beam,
+                                    dtype, chunksize, workers)
     
+    def Q_to_angles(self, Q, wavelength=None, energy=8048., start=None,
+                    limits=None, tol=1e-8, maxiter=50, **fixed):
+        """
+            Motor positions reaching the momentum transfers Q (N, 3) in
+            the sample frame, e.g. for a list of reflections.
+
+            The used motors (see usemotors) are free unless their position
+            is given as keyword argument (scalar or one per Q). Unused
+            motors are set to zero.
+
+            Inputs:
+                start  -- dict of start positions of the free motors
+                          (default: 0). The solution closest to them is
+                          returned.
+                limits -- dict of (min, max) positions of motors
+            see kinematics.solve_angles for the other inputs.
+
+            Positions include the offsets. Returns a dict of the positions
+            of all used motors and the boolean mask of the reachable Q.
+        """
+        sample_ax, detector_ax = self.get_axes()
+        motors = [mot for (mot, ax) in sample_ax + detector_ax]
+        for mot in fixed:
+            if mot not in motors:
+                raise ValueError("Motor %s is not used in this geometry" % mot)
+        start = dict(start or ())
+        start.update(fixed)
+        limits = limits or dict()
+        positions = [np.asarray(start.get(mot, 0.)) - self.offsets[mot]
+                     for mot in motors]
+        bounds = [None if mot not in limits else
+                  (limits[mot][0] - self.offsets[mot],
+                   limits[mot][1] - self.offsets[mot]) for mot in motors]
+        nsample = len(sample_ax)
+        angles, reachable = kinematics.solve_angles(
+            [ax for (mot, ax) in sample_ax],
+            [ax for (mot, ax) in detector_ax],
+            positions[:nsample], positions[nsample:],
+            [mot not in fixed for mot in motors], Q, wavelength, energy,
+            self.inc_beam, bounds, tol, maxiter)
+        result = collections.OrderedDict((mot, angles[:, i] + self.offsets[mot])
+                                         for (i, mot) in enumerate(motors))
+        return result, reachable
+
     def set_offsets(self, **kwargs):
         """
             Set offset for each motor to be subtracted from its position.
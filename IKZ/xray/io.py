@@ -6,13 +6,145 @@ import zipfile
 import os
 import sys
 import xml.etree.ElementTree as ET
-import xmltodict
 import collections
 import numpy as np
 import time
-import locale
+import logging
+import contextlib
+import hashlib
+import codecs
+import re
+import threading
 
 from io import BytesIO, StringIO
+from concurrent import futures
+from timeit import default_timer
+
+
+logger = logging.getLogger(__name__)
+
+
+class LoadStats(object):
+    """
+        Timings and counters collected while loading a measurement file.
+
+        After loading, the readers of this module provide an instance as
+        ``.stats`` with:
+            .times      - seconds spent per phase (e.g. "inflate", "xml")
+            .counts     - number of processed items per category
+            .nbytes     - number of uncompressed bytes read
+            .walltime   - total time spent for loading
+    """
+    def __init__(self, name=None):
+        self.name = name
+        self.times = collections.OrderedDict()
+        self.counts = collections.OrderedDict()
+        self.nbytes = 0
+        self.walltime = 0.
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+            Context manager adding the time spent inside to phase ``name``.
+        """
+        t0 = default_timer()
+        try:
+            yield
+        finally:
+            dt = default_timer() - t0
+            with self._lock:
+                self.times[name] = self.times.get(name, 0.) + dt
+
+    def count(self, name, num=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + num
+
+    def read(self, fh, member):
+        """
+            Read and inflate ``member`` of the zipfile.ZipFile ``fh``
+            while accounting time and size.
+        """
+        with self.phase("inflate"):
+            content = fh.read(member)
+        with self._lock:
+            self.nbytes += len(content)
+        self.count("members")
+        return content
+
+    def summary(self):
+        lines = ["%s: %.3fs, %.1f MB" % (self.name, self.walltime,
+                                         self.nbytes / 1e6)]
+        for phase, dt in self.times.items():
+            frac = dt / self.walltime if self.walltime else np.nan
+            lines.append("  %-10s %8.3fs (%3.0f%%)" % (phase, dt, 100 * frac))
+        for name, num in self.counts.items():
+            lines.append("  %-10s %8i" % (name, num))
+        return os.linesep.join(lines)
+
+    def log(self, level=logging.INFO):
+        logger.log(level, "%s", self.summary())
+
+    def __repr__(self):
+        return self.summary()
+
+
+def print_progress(stage, i, num):
+    """
+        Default progress callback used for ``verbose`` loading.
+    """
+    if not i:
+        print("Loading %s..." % stage)
+    sys.stdout.write("\r%5i/%i" % (i + 1, num))
+    if i + 1 == num:
+        print()
+
+
+def _nbytes(result):
+    if isinstance(result, (tuple, list)):
+        return sum(map(_nbytes, result))
+    return getattr(result, "nbytes", 0)
+
+
+def prefetch_map(func, items, depth=4, workers=1, max_bytes=None):
+    """
+        Yields ``func(item)`` for all ``items`` in order, while the results
+        for the next ``depth`` items are computed in the background by a
+        pool of ``workers`` threads. With ``depth=0`` everything is done
+        in the calling thread.
+
+        No further items are started as long as the finished but not yet
+        consumed results take more than ``max_bytes`` (counting the
+        ``nbytes`` of arrays).
+    """
+    if not depth:
+        for item in items:
+            yield func(item)
+        return
+    items = iter(items)
+    pending = collections.deque()
+    pool = futures.ThreadPoolExecutor(workers)
+    def fill():
+        while len(pending) < depth:
+            if max_bytes is not None:
+                done = [job.result() for job in pending if job.done()]
+                if sum(map(_nbytes, done)) >= max_bytes:
+                    break
+            try:
+                item = next(items)
+            except StopIteration:
+                break
+            pending.append(pool.submit(func, item))
+    try:
+        fill()
+        while pending:
+            result = pending.popleft().result()
+            fill()
+            yield result
+    finally:
+        for job in pending:
+            job.cancel()
+        pool.shutdown()
 
 
 def try_scalar(val):
@@ -27,23 +159,120 @@ def try_scalar(val):
     return val
 
 
-def parse_rasx_metadata(xml):
-    mdata = dict()
-    #xml.seek(0)
-    tree = ET.parse(xml)
-    measurement = tree.getroot()
+## python >= 3.7:
+#Distance = collections.namedtuple("Distance", ("To", "From", "Unit", "Value"), defaults=4*[None])
+## python < 3.7:
+Distance = collections.namedtuple('Distance', ("To", "From", "Unit", "Value"))
+Distance.__new__.__defaults__ = (None,) * len(Distance._fields)
 
-    for group in ["GeneralInformation", "ScanInformation", "SampleInformation", "RSMInformation"]:
-        groupobj = measurement.find(group)
-        if groupobj is None:
-            continue
-        mdata[group] = dict((info.tag, try_scalar(info.text)) for info in groupobj)
+## python >= 3.7:
+#Axis = collections.namedtuple("Axis",
+#                              ("Name", "Unit", "Offset", "Position", "Description"),
+#                              defaults=5*[None])
+## python < 3.7:
+Axis = collections.namedtuple('Axis',
+                              ("Name",
+                               "Unit",
+                               "Offset",
+                               "Position",
+                               "EndPosition",
+                               "Description",
+                               "State",
+                               "Resolution",
+                               "Speed",
+                               "SpeedUnit",
+                               "SpeedResolution",
+                               "OscillationWidth",
+                               ))
+Axis.__new__.__defaults__ = (None,) * len(Axis._fields)
+
+
+class ColumnTable(object):
+    """
+        Columnar store for scalar metadata of many frames.
+
+        Each key holds one array over all frames: numbers are stored in
+        float arrays (NaN where missing), everything else in object arrays
+        of interned strings. Rows are appended with amortized growth.
+
+        Usage:
+            table = ColumnTable()
+            table.append({"Position": 1.5, "Unit": "deg"})
+            table["Position"]  # -> array([1.5])
+    """
+    def __init__(self, capacity=16):
+        self.columns = collections.OrderedDict()
+        self._capacity = capacity
+        self._len = 0
 
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, key):
+        return key in self.columns
+
+    def __getitem__(self, key):
+        return self.columns[key][:self._len]
+
+    def keys(self):
+        return self.columns.keys()
+
+    def _grow(self):
+        self._capacity *= 2
+        for key, col in self.columns.items():
+            new = self._empty(col.dtype)
+            new[:len(col)] = col
+            self.columns[key] = new
+
+    def _empty(self, dtype):
+        if dtype == object:
+            return np.full(self._capacity, None, dtype=object)
+        return np.full(self._capacity, np.nan)
+
+    def append(self, row):
+        """
+            Append one frame given as dict of scalar values.
+        """
+        if self._len == self._capacity:
+            self._grow()
+        idx = self._len
+        for key, value in row.items():
+            isnum = isinstance(value, (int, float)) and not isinstance(value, bool)
+            col = self.columns.get(key)
+            if col is None:
+                col = self._empty(float if isnum else object)
+                self.columns[key] = col
+            elif not isnum and col.dtype != object:
+                col = self.columns[key] = col.astype(object)
+            if isinstance(value, str):
+                value = sys.intern(value)
+            col[idx] = value
+        self._len += 1
 
+    def value(self, key, rows=None):
+        """
+            Returns the column ``key`` as a single scalar if it is constant
+            over all frames or as array otherwise. Optionally, only the
+            frames given by the index array ``rows`` are considered.
+        """
+        col = self[key]
+        if rows is not None:
+            col = col[rows]
+        if col.dtype == object:
+            if all(val == col[0] for val in col):
+                return col[0]
+            return col
+        if (col == col[0]).all() or np.isnan(col).all():
+            return col[0].item()
+        return col
 
-    hwdict = mdata["HardwareConfig"] = dict()
-    hwconf = measurement.find("HWConfigurations")
 
+def _parse_info(group):
+    return dict((info.tag, try_scalar(info.text)) for info in group)
+
+
+def _parse_hwconfig(hwconf):
+    hwdict = dict()
     optics = hwdict["optics"] = dict()
     for category in hwconf.find("Categories"):
         optics[category.attrib["Name"]] = category.attrib["SelectedUnit"]
@@ -52,13 +281,6 @@ def parse_rasx_metadata(xml):
 
 
     distances = hwdict["distances"] = []
-    
-    ## python >= 3.7:
-    #Distance = collections.namedtuple("Distance", ("To", "From", "Unit", "Value"), defaults=4*[None])
-    ## python < 3.7:
-    Distance = collections.namedtuple('Distance', ("To", "From", "Unit", "Value"))
-    Distance.__new__.__defaults__ = (None,) * len(Distance._fields)
-
     for distance in hwconf.find("Distances"):
         attrib = distance.attrib.copy()
         attrib["Value"] = try_scalar(attrib["Value"])
@@ -66,12 +288,14 @@ def parse_rasx_metadata(xml):
 
 
 
-    hwdict["xraygenerator"] = dict((info.tag, try_scalar(info.text)) for info in hwconf.find("XrayGenerator"))
+    hwdict["xraygenerator"] = _parse_info(hwconf.find("XrayGenerator"))
+    return hwdict
 
 
-    header = mdata["RASHeader"] = dict()
+def _parse_rasheader(rasheader):
+    header = dict()
     axtitle = dict()
-    for info in measurement.find("RASHeader"):
+    for info in rasheader:
         pair = list(info)
         key = pair[0].text
         if "MEAS_COND_AXIS_NAME" in key:
@@ -79,30 +303,12 @@ def parse_rasx_metadata(xml):
             axtitle[num] = pair[1].text
         else:
             header[key] = pair[1].text
+    return header, axtitle
+
 
-    ## python >= 3.7:
-    #Axis = collections.namedtuple("Axis",
-    #                              ("Name", "Unit", "Offset", "Position", "Description"),
-    #                              defaults=5*[None])
-    ## python < 3.7:
-    Axis = collections.namedtuple('Axis',
-                                  ("Name",
-                                   "Unit",
-                                   "Offset",
-                                   "Position",
-                                   "EndPosition",
-                                   "Description",
-                                   "State",
-                                   "Resolution",
-                                   "Speed",
-                                   "SpeedUnit",
-                                   "SpeedResolution",
-                                   "OscillationWidth",
-                                   ))
-    Axis.__new__.__defaults__ = (None,) * len(Axis._fields)
-
-    axes = mdata["Axes"] = collections.OrderedDict()
-    for i, axis in enumerate(measurement.find("Axes")):
+def _parse_axes(axeselem, axtitle):
+    axes = collections.OrderedDict()
+    for i, axis in enumerate(axeselem):
         attrib = axis.attrib.copy()
         attrib["Description"] = axtitle[i]
         for key in ("Offset", "Position"):
@@ -111,108 +317,470 @@ def parse_rasx_metadata(xml):
         if len(attrib) < len(axis.attrib):
             missing = set(axis.attrib).difference(set(attrib))
             for key in missing:
-                print("Warning: unknown axis attribute: %s"%k)
+                logger.warning("unknown axis attribute: %s", key)
         axes[axis.attrib["Name"]] = Axis(**attrib)
+    return axes
+
+
+_rasx_info_groups = ("GeneralInformation",
+                     "ScanInformation",
+                     "SampleInformation",
+                     "RSMInformation")
 
+# converters of the top level sections of the MesurementConditions*.xml
+_rasx_sections = dict.fromkeys(_rasx_info_groups, _parse_info)
+_rasx_sections["HWConfigurations"] = _parse_hwconfig
+_rasx_sections["RASHeader"] = _parse_rasheader
+_rasx_sections["Axes"] = lambda elem: elem # needs RASHeader -> _assemble
 
+
+def _assemble_rasx_metadata(sections):
+    mdata = dict()
+    for group in _rasx_info_groups:
+        if group in sections:
+            mdata[group] = sections[group]
+    mdata["HardwareConfig"] = sections["HWConfigurations"]
+    mdata["RASHeader"], axtitle = sections["RASHeader"]
+    mdata["Axes"] = _parse_axes(sections["Axes"], axtitle)
     return mdata
 
 
+def parse_rasx_metadata(xml):
+    #xml.seek(0)
+    tree = ET.parse(xml)
+    measurement = tree.getroot()
+
+    sections = dict()
+    for tag, convert in _rasx_sections.items():
+        elem = measurement.find(tag)
+        if elem is not None:
+            sections[tag] = convert(elem)
+
+    return _assemble_rasx_metadata(sections)
+
+
+class RASXMetaParser(object):
+    """
+        Parser for the MesurementConditions*.xml files of one RASX
+        archive.
+
+        Most sections (HWConfigurations, RASHeader, SampleInformation,
+        ...) are identical for all frames. They are fingerprinted and
+        parsed only once, while ``Axes`` and ``ScanInformation`` are parsed
+        for each frame. Therefore the returned metadata of different frames
+        share these objects, which must not be modified in place.
+
+        Falls back to parse_rasx_metadata if the layout is not understood.
+
+        Usage:
+            parser = RASXMetaParser()
+            mdata = parser(content) # bytes of the xml file
+    """
+    _varying = ("Axes", "ScanInformation")
+    _encoding = re.compile(br'<\?xml[^>]*encoding="([^"]+)"')
+    _root = re.compile(br'<[^?!][^>]*>')
+    _xmlns = re.compile(br'\sxmlns(:[\w.-]+)?="[^"]*"')
+
+    def __init__(self):
+        self.cache = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def sections(self, content):
+        """
+            Cut the raw top level sections out of the xml content.
+        """
+        if content.startswith(codecs.BOM_UTF8):
+            content = content[len(codecs.BOM_UTF8):]
+        encoding = self._encoding.match(content)
+        if encoding and encoding.group(1).lower() not in (b"utf-8", b"utf8"):
+            return None
+        # namespaces declared on the root element, e.g. xmlns:xsi, are
+        # needed to parse the sections on their own
+        root = self._root.search(content)
+        xmlns = [decl.group(0) for decl in
+                 self._xmlns.finditer(root.group(0))] if root else []
+        sections = dict()
+        for tag in _rasx_sections:
+            opening = b"<" + tag.encode()
+            start = content.find(opening)
+            if start < 0:
+                continue
+            if content.find(opening, start + 1) >= 0:
+                return None # nested or repeated section
+            head = content.find(b">", start)
+            if content[start + len(opening)] not in b" \t\r\n/>" or head < 0:
+                return None
+            if content[head - 1:head] == b"/":
+                stop = head + 1
+            else:
+                stop = content.find(b"</" + tag.encode() + b">", head)
+                if stop < 0:
+                    return None
+                stop += len(tag) + 3
+            own = content[start:head]
+            decls = b"".join(decl for decl in xmlns
+                             if decl.split(b"=")[0].strip() + b"=" not in own)
+            sections[tag] = opening + decls + content[start + len(opening):stop]
+        return sections
+
+    def __call__(self, content):
+        fragments = self.sections(content)
+        if fragments is None or \
+           not all(tag in fragments for tag in ("HWConfigurations",
+                                                "RASHeader",
+                                                "Axes")):
+            return parse_rasx_metadata(BytesIO(content))
+
+        sections = dict()
+        try:
+            for tag, fragment in fragments.items():
+                convert = _rasx_sections[tag]
+                if tag in self._varying:
+                    sections[tag] = convert(ET.fromstring(fragment))
+                    continue
+                key = hashlib.sha1(fragment).digest()
+                if key in self.cache:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    self.cache[key] = convert(ET.fromstring(fragment))
+                sections[tag] = self.cache[key]
+        except ET.ParseError:
+            return parse_rasx_metadata(BytesIO(content))
+
+        return _assemble_rasx_metadata(sections)
+
+
+def axes_row(mdata):
+    """
+        Flattens the ``Axes`` of parsed RASX metadata into a row for a
+        ColumnTable with keys ``(axis name, field)``.
+    """
+    row = dict()
+    for axis in mdata["Axes"].values():
+        for field, value in zip(Axis._fields[1:], axis[1:]):
+            if isinstance(value, str):
+                value = try_scalar(value)
+            if value is not None:
+                row[(axis.Name, field)] = value
+    return row
+
+
+def detector_shape(mdata):
+    """
+        Shape of the detector frames according to the RASX metadata.
+    """
+    optics = mdata["HardwareConfig"]["optics"]
+    if optics["Detector"] == 'HyPix3000(H)':
+        return 385, 775
+    elif optics["Detector"] == 'HyPix3000(V)':
+        return 775, 385
+    else:
+        return -1,
+
+
+def read_rasx_member(fh, name, parse_meta=None, stats=None):
+    """
+        Reads the Profile or Image ``name`` of the opened .rasx archive
+        (zipfile.ZipFile) ``fh`` together with its metadata.
+
+        Returns:
+            metadata, data
+    """
+    if parse_meta is None:
+        parse_meta = lambda content: parse_rasx_metadata(BytesIO(content))
+    if stats is None:
+        stats = LoadStats()
+    kind = "Profile" if "Profile" in name else "Image"
+    metafile = name.replace(kind, "MesurementConditions")
+    metafile = metafile[:-4] + ".xml"
+    content = stats.read(fh, metafile)
+    with stats.phase("xml"):
+        mdata = parse_meta(content)
+    content = stats.read(fh, name)
+    if kind == "Profile":
+        with stats.phase("loadtxt"):
+            # skip the 3 non-ascii symbols at the start
+            data = np.loadtxt(BytesIO(content[3:]))
+    else:
+        with stats.phase("decode"):
+            data = np.frombuffer(content, dtype=np.uint32)
+            data = data.reshape(detector_shape(mdata))
+    return mdata, data
+
+
+def iter_rasx(path, kind="Image", depth=4, workers=1, max_bytes=None):
+    """
+        Yields (metadata, data) for all members of type ``kind``
+        ("Image" or "Profile") of a .rasx file. The following ``depth``
+        members are read and decoded in the background while the current
+        one is processed (see prefetch_map).
+    """
+    with zipfile.ZipFile(path) as fh:
+        names = [f.filename for f in fh.filelist if kind in f.filename]
+        parse_meta = RASXMetaParser()
+        read = lambda name: read_rasx_member(fh, name, parse_meta)
+        for result in prefetch_map(read, names, depth, workers, max_bytes):
+            yield result
+
+
+def expand_rows(values, offsets):
+    """
+        Expands one value per row to one value per point for data in
+        flat layout, where row ``i`` spans ``offsets[i]:offsets[i+1]``.
+    """
+    return np.repeat(values, np.diff(offsets))
+
+
+class _GrowingArray(object):
+    """
+        Stack of equally shaped rows that can be extended with amortized
+        growth. ``.view`` is the filled part of the buffer.
+    """
+    def __init__(self, rows):
+        self._buf = np.array(rows)
+        self._len = len(self._buf)
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def view(self):
+        return self._buf[:self._len]
+
+    def extend(self, rows):
+        rows = np.asarray(rows)
+        num = self._len + len(rows)
+        if num > len(self._buf):
+            shape = (max(num, 2 * len(self._buf)),) + self._buf.shape[1:]
+            buf = np.empty(shape, dtype=np.result_type(self._buf, rows))
+            buf[:self._len] = self.view
+            self._buf = buf
+        self._buf[self._len:num] = rows
+        self._len = num
+
+
 class RASXfile(object):
-    def __init__(self, path, verbose=True):
-        with zipfile.ZipFile(path) as fh:
-            profiles = [f.filename for f in fh.filelist if "Profile" in f.filename]
+    def __init__(self, path, verbose=True, progress=None, keep_meta=False,
+                 fast_meta=True, prefetch=0, frames="dense"):
+        """
+            Loads profiles, detector frames and metadata of a Rigaku
+            .rasx file.
+
+            ``progress`` is an optional callback ``progress(stage, i, num)``
+            called for every loaded member. If not given and ``verbose``
+            is True, the progress is printed.
+
+            The metadata varying between frames is stored in columnar form:
+                .axes       - ColumnTable with keys (axis name, field)
+                .scaninfo   - ColumnTable of the ScanInformation
+            By default, ``.meta`` only holds the metadata trees of the
+            first profile and of the first detector frame. With
+            ``keep_meta`` set to True, it holds one tree per profile and
+            frame as before. ``.detector`` is the name of the detector
+            that recorded the frames (None without frames).
+            With ``fast_meta`` the sections of the metadata that repeat
+            in every frame are parsed only once (see RASXMetaParser).
+
+            Profiles and frames added to the file later, e.g. during a
+            running measurement, are loaded by calling ``.update()``.
+
+            With ``prefetch`` > 0, that many members are inflated and
+            decoded ahead in a background thread.
+
+            With ``frames="adaptive"``, ``.images`` is an
+            IKZ.process.frames.FrameStack storing each frame dense with
+            the smallest fitting integer type or sparse, instead of one
+            dense uint32 array.
+
+            Timings of the loading phases are available in ``.stats``.
+        """
+        if progress is None and verbose:
+            progress = print_progress
+        self.path = path
+        self.stats = LoadStats(path)
+        self.meta = []
+        self.axes = ColumnTable()
+        self.scaninfo = ColumnTable()
+        self.data = []
+        self.images = np.array([])
+        self.detector = None
+        self._ndscan = False
+        self._keep_meta = keep_meta
+        self._meta_kinds = set()
+        if fast_meta:
+            self._parse_meta = RASXMetaParser()
+        else:
+            self._parse_meta = lambda content: parse_rasx_metadata(BytesIO(content))
+        self._prefetch = prefetch
+        if frames == "adaptive":
+            from ..process.frames import FrameStack
+            self._framestack = FrameStack()
+        elif frames == "dense":
+            self._framestack = None
+        else:
+            raise ValueError("frames must be 'dense' or 'adaptive'")
+        self._consumed = set()
+        self._profile_rows = []
+        self._stack = None
+        self._frames = None
+        self._load(progress)
+        self.stats.log()
+
+    def _add_meta(self, mdata, kind):
+        self.axes.append(axes_row(mdata))
+        self.scaninfo.append(mdata.get("ScanInformation", {}))
+        if self._keep_meta or kind not in self._meta_kinds:
+            self.meta.append(mdata)
+            self._meta_kinds.add(kind)
+        return mdata
+
+    def _load(self, progress=None):
+        """
+            Loads all profiles and images that have not been loaded yet.
+        """
+        stats = self.stats
+        parse_meta = self._parse_meta
+        t0 = default_timer()
+        with zipfile.ZipFile(self.path) as fh:
+            members = [f.filename for f in fh.filelist
+                                  if f.filename not in self._consumed]
+            profiles = [name for name in members if "Profile" in name]
             numscans = len(profiles)
+            read = lambda name: read_rasx_member(fh, name, parse_meta, stats)
             data = []
-            meta = []
-            for i in range(numscans):
-                if verbose:
-                    if not i:
-                        print("Loading profiles...")
-                    sys.stdout.write("\r%5i/%i"%(i+1, numscans))
-                profile = profiles[i]
-                metafile = profile.replace("Profile", "MesurementConditions")
-                metafile = metafile[:-4] + ".xml"
-                #print(fname)
-                with fh.open(profile) as f:
-                    ## python >= 3.7:
-                    #f.seek(3) # skip the 3 non-ascii symbols at the start
-                    #data.append(np.loadtxt(f))
-                    ## the ugly way to stay python < 3.7 compatible:
-                    _content = BytesIO(f.read()[3:])
-                    data.append(np.loadtxt(_content))
-                with fh.open(metafile) as xml:
-                    meta.append(parse_rasx_metadata(xml))
-
-            images = [f.filename for f in fh.filelist if "Image" in f.filename]
+            loaded = prefetch_map(read, profiles, self._prefetch)
+            for i, (mdata, profile) in enumerate(loaded):
+                if progress is not None:
+                    progress("profiles", i, numscans)
+                data.append(profile)
+                self._add_meta(mdata, "profile")
+                self._profile_rows.append(len(self.axes) - 1)
+                stats.count("profiles")
+
+            images = [name for name in members if "Image" in name]
             numimg = len(images)
 
 
             imgdata = []
-            for i in range(numimg):
-                if verbose:
-                    if not i:
-                        print("Loading frames...")
-                    sys.stdout.write("\r%5i/%i"%(i+1, numimg))
-                imgpath = images[i]
-                metafile = imgpath.replace("Image", "MesurementConditions")
-                metafile = metafile[:-4] + ".xml"
-                #print(fname)
-
-                with fh.open(metafile) as xml:
-                    meta.append(parse_rasx_metadata(xml))
-                optics = meta[-1]["HardwareConfig"]["optics"]
-                if optics["Detector"] == 'HyPix3000(H)':
-                    det_shape = 385, 775
-                elif optics["Detector"] == 'HyPix3000(V)':
-                    det_shape = 775, 385
-                else:
-                    det_shape = -1,
-                with fh.open(imgpath) as f:
-                    imgarr = np.fromstring(f.read(), dtype=np.uint32)
-                    imgarr.resize(det_shape)
+            loaded = prefetch_map(read, images, self._prefetch)
+            for i, (mdata, imgarr) in enumerate(loaded):
+                if progress is not None:
+                    progress("frames", i, numimg)
+                if self._framestack is None:
                     imgdata.append(imgarr)
+                else:
+                    with stats.phase("compress"):
+                        self._framestack.append(imgarr)
+                self._add_meta(mdata, "image")
+                if self.detector is None:
+                    optics = mdata["HardwareConfig"]["optics"]
+                    self.detector = optics["Detector"]
+                stats.count("images")
 
-            if verbose:
-                print()
+            if isinstance(parse_meta, RASXMetaParser):
+                stats.counts["xml reused"] = parse_meta.hits
 
-        self._ndscan = len(np.unique(list(map(len, data))))==1
-        if self._ndscan:
-            data = np.array(data)
-        imgdata = np.array(imgdata)
+        with stats.phase("stack"):
+            self._consumed.update(profiles)
+            self._consumed.update(images)
+            self._extend_data(data)
+            if imgdata:
+                if self._frames is None:
+                    self._frames = _GrowingArray(imgdata)
+                else:
+                    self._frames.extend(imgdata)
+                self.images = self._frames.view
+            elif self._framestack is not None and len(self._framestack):
+                self.images = self._framestack
 
-        self.data = data
-        self.images = imgdata
-        self.meta = meta
-        self.positions = collections.defaultdict(list)
+        self.positions = dict()
         self.units = dict()
-        for mdata in meta:
-            for axis in mdata["Axes"].values():
-                self.positions[axis.Name].append(axis.Position)
-                self.units[axis.Name] = axis.Unit
-        for axis in self.positions:
-            if len(set(self.positions[axis])) == 1:
-                self.positions[axis] = self.positions[axis][0]
-            else:
-                self.positions[axis] = np.array(self.positions[axis])
+        with stats.phase("positions"):
+            for (name, field) in self.axes.keys():
+                if field == "Position":
+                    self.positions[name] = self.axes.value((name, field))
+                elif field == "Unit":
+                    self.units[name] = self.axes[(name, field)][-1]
+        stats.walltime += default_timer() - t0
+        return numscans + numimg
+
+    def _extend_data(self, data):
+        if not data:
+            return
+        lengths = set(map(len, data))
+        if self._stack is None and not self.data and len(lengths) == 1:
+            self._stack = _GrowingArray(data)
+        elif self._stack is not None and lengths == {self._stack.view.shape[1]}:
+            self._stack.extend(data)
+        else:
+            # ragged scan: keep a list of profiles
+            self.data = list(self.data) + data
+            self._stack = None
+        if self._stack is not None:
+            self.data = self._stack.view
+        self._ndscan = self._stack is not None
+
+    def update(self, progress=None):
+        """
+            Loads the profiles and frames that were added to the file
+            since the last call, e.g. during a running measurement.
+            Their metadata is appended to ``.meta``, ``.axes`` and
+            ``.scaninfo`` in the order of loading.
 
-    def get_RSM(self):
-        pos, I, _ = self.data.transpose(2,0,1).squeeze()
-        output = dict(Intensity=I)
+            Returns the number of newly loaded profiles and frames.
+        """
+        try:
+            return self._load(progress)
+        except zipfile.BadZipFile:
+            # the archive is currently being written
+            return 0
+
+    def get_RSM(self, flat=None):
+        """
+            Returns the intensities of all profiles together with the
+            positions of the motors as dict.
+
+            Motors that did not move are returned as scalars. Motors
+            varying from profile to profile are returned as read-only
+            broadcast views of the shape of the intensity, which do not
+            take additional memory.
+
+            For ragged scans (profiles of different lengths) or if ``flat``
+            is True, the points of all profiles are concatenated to 1D
+            arrays and ``offsets`` gives the start of each profile
+            (number of profiles + 1 entries). Motors varying between
+            profiles are then given as one value per profile and can be
+            expanded to one value per point by ``expand_rows``.
+        """
+        if flat is None:
+            flat = not self._ndscan
         mot = self.meta[0]["ScanInformation"]["AxisName"]
-        output[mot] = pos
+        if flat:
+            lengths = list(map(len, self.data))
+            offsets = np.zeros(len(lengths) + 1, dtype=int)
+            np.cumsum(lengths, out=offsets[1:])
+            points = np.concatenate(self.data)
+            output = dict(Intensity=points[:,1], offsets=offsets)
+            output[mot] = points[:,0]
+        else:
+            pos, I, _ = self.data.transpose(2,0,1).squeeze()
+            output = dict(Intensity=I)
+            output[mot] = pos
+        rows = np.asarray(self._profile_rows)
         for axis in ["Omega", "Chi", "Phi", "TwoTheta", "TwoThetaChi"]:
-            if axis in output:
+            if axis in output or (axis, "Position") not in self.axes:
                 continue
-            axdata = self.positions[axis]
-            if np.ndim(axdata):
-                axdata = axdata[:,None] * np.ones_like(I)
+            axdata = self.axes.value((axis, "Position"), rows)
+            if np.ndim(axdata) and not flat:
+                axdata = np.broadcast_to(axdata[:,None], I.shape)
             output[axis] = axdata
 
         return output
     
     def get_starttime(self, idx=0, to_seconds=True):
-        starttime = self.meta[idx]["ScanInformation"]["StartTime"]
+        starttime = self.scaninfo["StartTime"][idx]
         parsed_time = time.strptime(starttime, "%Y-%m-%dT%H:%M:%SZ")
         if to_seconds:
             return time.mktime(parsed_time)
@@ -220,75 +788,134 @@ class RASXfile(object):
             return parsed_time
 
 
+def parse_brml_rawdata(content, encoding="utf-8", stats=None):
+    """
+        Parses the content of one RawData xml file of a .brml file.
+
+        Returns a list of (name, value) pairs of the data views, scan
+        information, scan axes and drive positions.
+    """
+    import xmltodict # only needed for .brml files
+    if stats is None:
+        stats = LoadStats()
+    with stats.phase("xml"):
+        data = xmltodict.parse(content, encoding=encoding)
+    entries = []
+    dataroute = data["RawData"]["DataRoutes"]["DataRoute"]
+    scaninfo = dataroute["ScanInformation"]
+    nsteps = int(scaninfo["MeasurementPoints"])
+    with stats.phase("convert"):
+        if nsteps==1:
+            rawdata = np.array(dataroute["Datum"].split(","))
+        elif nsteps>1:
+            rawdata = np.array([d.split(",") for d in dataroute["Datum"]])
+        rawdata = rawdata.astype(float).T
+    stats.count("frames")
+    stats.count("points", nsteps)
+    rdv = dataroute["DataViews"]["RawDataView"]
+    for view in rdv:
+        viewtype = view["@xsi:type"]
+        vstart = int(view["@Start"])
+        vlen = int(view["@Length"])
+        if viewtype=="FixedRawDataView":
+            vname = view["@LogicName"]
+            entries.append((vname, rawdata[vstart:(vstart+vlen)]))
+        elif viewtype=="RecordedRawDataView":
+            vname = view["Recording"]["@LogicName"]
+            entries.append((vname, rawdata[vstart:(vstart+vlen)]))
+            
+    entries.append(("ScanName", scaninfo["@ScanName"]))
+    entries.append(("TimePerStep", scaninfo["TimePerStep"]))
+    entries.append(("TimePerStepEffective", scaninfo["TimePerStepEffective"]))
+    entries.append(("ScanMode", scaninfo["ScanMode"]))
+    
+    scanaxes = scaninfo["ScanAxes"]["ScanAxisInfo"]
+    if not isinstance(scanaxes, list):
+        scanaxes = [scanaxes]
+    for axis in scanaxes:
+        aname = axis["@AxisName"]
+        aunit = axis["Unit"]["@Base"]
+        aref = float(axis["Reference"])
+        astart = float(axis["Start"]) + aref
+        astop = float(axis["Stop"]) + aref
+        astep = float(axis["Increment"])
+        nint = int(round(abs(astop-astart)/astep))
+        entries.append((aname, np.linspace(astart, astop, nint+1)))
+
+    drives = data["RawData"]["FixedInformation"]["Drives"]["InfoData"]
+    for axis in drives:
+        aname = axis["@LogicName"]
+        apos = float(axis["Position"]["@Value"])
+        entries.append((aname, apos))
+    return entries
+
+
+def iter_brml(path, exp_nbr=0, encoding="utf-8", depth=4, workers=1,
+              max_bytes=None):
+    """
+        Yields the list of (name, value) pairs (see parse_brml_rawdata)
+        of all raw data files of experiment ``exp_nbr`` of a .brml file.
+        The following ``depth`` files are read and parsed in the
+        background while the current one is processed (see prefetch_map).
+    """
+    import xmltodict
+    with zipfile.ZipFile(path, 'r') as fh:
+        datacontainer = "Experiment%i/DataContainer.xml"%exp_nbr
+        data = xmltodict.parse(fh.read(datacontainer), encoding=encoding)
+        rawlist = data["DataContainer"]["RawDataReferenceList"]["string"]
+        if not isinstance(rawlist, list):
+            rawlist = [rawlist]
+        read = lambda rawpath: parse_brml_rawdata(fh.read(rawpath), encoding)
+        for entries in prefetch_map(read, rawlist, depth, workers, max_bytes):
+            yield entries
+
+
 class BRMLfile(object):
-    def __init__(self, path, exp_nbr=0, encoding="utf-8", verbose=True):
+    def __init__(self, path, exp_nbr=0, encoding="utf-8", verbose=True,
+                 progress=None, prefetch=0):
+        """
+            Loads the raw data of experiment ``exp_nbr`` of a Bruker .brml
+            file.
+
+            ``progress`` is an optional callback ``progress(stage, i, num)``
+            called for every loaded frame. If not given and ``verbose``
+            is True, the progress is printed.
+
+            With ``prefetch`` > 0, that many raw data files are inflated and
+            parsed ahead in a background thread.
+
+            Timings of the loading phases are available in ``.stats``.
+        """
+        import xmltodict
+        if progress is None and verbose:
+            progress = print_progress
         self.path = path
+        self.stats = stats = LoadStats(path)
+        t0 = default_timer()
         with zipfile.ZipFile(path, 'r') as fh:
             experiment = "Experiment%i"%exp_nbr
             datacontainer = "%s/DataContainer.xml"%experiment
 
-            with fh.open(datacontainer, "r") as xml:
-                data = xmltodict.parse(xml.read(), encoding=encoding)
+            content = stats.read(fh, datacontainer)
+            with stats.phase("xml"):
+                data = xmltodict.parse(content, encoding=encoding)
             rawlist = data["DataContainer"]["RawDataReferenceList"]["string"]
             if not isinstance(rawlist, list):
                 rawlist = [rawlist]
 
             self.data = collections.defaultdict(list)
             self.motors = self.data # collections.defaultdict(list)
-            for i, rawpath in enumerate(rawlist):
-                if verbose:
-                    if not i:
-                        print("Loading frame %i"%i, end="")
-                    else:
-                        print(", %i"%i, end="")
-                with fh.open(rawpath, "r") as xml:
-                    data = xmltodict.parse(xml.read(), encoding=encoding)
-                dataroute = data["RawData"]["DataRoutes"]["DataRoute"]
-                scaninfo = dataroute["ScanInformation"]
-                nsteps = int(scaninfo["MeasurementPoints"])
-                if nsteps==1:
-                    rawdata = np.array(dataroute["Datum"].split(","))
-                elif nsteps>1:
-                    rawdata = np.array([d.split(",") for d in dataroute["Datum"]])
-
-                rawdata = rawdata.astype(float).T
-                rdv = dataroute["DataViews"]["RawDataView"]
-                for view in rdv:
-                    viewtype = view["@xsi:type"]
-                    vstart = int(view["@Start"])
-                    vlen = int(view["@Length"])
-                    if viewtype=="FixedRawDataView":
-                        vname = view["@LogicName"]
-                        self.data[vname].append(rawdata[vstart:(vstart+vlen)])
-                    elif viewtype=="RecordedRawDataView":
-                        vname = view["Recording"]["@LogicName"]
-                        self.data[vname].append(rawdata[vstart:(vstart+vlen)])
-                        
-                self.data["ScanName"].append(scaninfo["@ScanName"])
-                self.data["TimePerStep"].append(scaninfo["TimePerStep"])
-                self.data["TimePerStepEffective"].append(scaninfo["TimePerStepEffective"])
-                self.data["ScanMode"].append(scaninfo["ScanMode"])
-                
-                scanaxes = scaninfo["ScanAxes"]["ScanAxisInfo"]
-                if not isinstance(scanaxes, list):
-                    scanaxes = [scanaxes]
-                for axis in scanaxes:
-                    aname = axis["@AxisName"]
-                    aunit = axis["Unit"]["@Base"]
-                    aref = float(axis["Reference"])
-                    astart = float(axis["Start"]) + aref
-                    astop = float(axis["Stop"]) + aref
-                    astep = float(axis["Increment"])
-                    nint = int(round(abs(astop-astart)/astep))
-                    self.data[aname].append(np.linspace(astart, astop, nint+1))
-
-                drives = data["RawData"]["FixedInformation"]["Drives"]["InfoData"]
-                for axis in drives:
-                    aname = axis["@LogicName"]
-                    apos = float(axis["Position"]["@Value"])
-                    self.motors[aname].append(apos)
+            read = lambda rawpath: parse_brml_rawdata(stats.read(fh, rawpath),
+                                                      encoding, stats)
+            loaded = prefetch_map(read, rawlist, prefetch)
+            for i, entries in enumerate(loaded):
+                if progress is not None:
+                    progress("frames", i, len(rawlist))
+                for key, value in entries:
+                    self.data[key].append(value)
             
             
+        with stats.phase("stack"):
             for key in self.data:
                 self.data[key] = np.array(self.data[key]).squeeze()
                 if not self.data[key].shape:
@@ -297,18 +924,94 @@ class BRMLfile(object):
                 self.motors[key] = np.array(self.motors[key]).squeeze()
                 if not self.motors[key].shape:
                     self.motors[key] = self.motors[key].item()
+        stats.walltime = default_timer() - t0
+        stats.log()
 
 
 
 
 
+def read_fio_header(data):
+    """
+        Reads the header of a .fio file from the file handle ``data`` up to
+        the first line of the data block.
+
+        Returns:
+            comment, parameters, colname, line
+        where ``line`` is the first line of the data block.
+    """
+    comment = ""
+    parameters = {}
+    colname = []
+    flag = True
+    while flag:
+        line = data.readline()
+        if not line: break
+        if not line.find("!"):
+            continue
+        if "%c" in line:
+            line = data.readline()
+            while not line.startswith("!"):
+                if not line: break
+                comment+=line
+                line = data.readline()
+        if "%p" in line:
+            line = data.readline()
+            while not ("! Data" in line):
+                if line.startswith("!"): 
+                    line = data.readline()
+                    continue
+                elif not line: break
+                line=line.replace(" ","")
+                [param, value]=line.split("=")
+                try:
+                    value = float(value)
+                except:
+                    pass
+                parameters[param] = value
+                line = data.readline()
+        if "%d" in line:
+            line = data.readline()
+            while not line.startswith("!"):
+                if not line: break
+                if "Col" in line:
+                    colname.append(line.split()[2])
+                else: 
+                    flag = False
+                    break
+                line = data.readline()
+    return comment, parameters, colname, line
+
+
+_fio_months = ["jan", "feb", "mar", "apr", "may", "jun",
+               "jul", "aug", "sep", "oct", "nov", "dec"]
+
+
+def parse_fio_times(comment):
+    """
+        Returns start and stop time of a scan as struct_time parsed from
+        the comment of a .fio file.
+    """
+    words = comment.split()
+    i1 = words.index("ended")
+    day = words[i1-2]
+    time0 = words[i1-1][:-1]
+    timeE = words[i1+1]
+    # month names are always English, independent of the locale
+    dd, month, yyyy = day.split("-")
+    day = "%s-%02i-%s" % (dd, _fio_months.index(month[:3].lower()) + 1, yyyy)
+    starttime = time.strptime(day + time0, "%d-%m-%Y%H:%M:%S")
+    stoptime = time.strptime(day + timeE, "%d-%m-%Y%H:%M:%S")
+    return starttime, stoptime
+
+
 class FIOdata(object):
     """ 
         This class handles measurement data files that are present in
         the .fio format which is produced at the DESY Photon Science
         Instruments.
     """
-    def __init__(self, FILENAME, verbose=False):
+    def __init__(self, FILENAME, verbose=False, follow=False):
         """
             This opens a .fio file using a path to the file or a file
             handle. If verbose is True, additional information is printed.
@@ -324,12 +1027,29 @@ class FIOdata(object):
             .stopsec    - unix time of measurement stop
             .starttime  - struct_time of measurement start
             .stoptime   - struct_time of measurement stop
+            .stats      - LoadStats with timings of the loading phases
             
             Methods:
             .normalize  - method to normalize all columns onto a selected one
             .to_dat     - convert to .dat format (columns with 1 header line)
+            .update     - read rows appended to the file (needs follow=True)
+
+            With ``follow`` set to True, FILENAME has to be a path. Only
+            complete lines are read and ``.update()`` reads the rows
+            written to the file afterwards, e.g. during a running scan.
         """
-        if isinstance(FILENAME, str):
+        self._path = None
+        if follow:
+            if not isinstance(FILENAME, str):
+                raise ValueError('follow mode requires fname to be a string')
+            if verbose: print("Following %s"%FILENAME)
+            with open(FILENAME, "rb") as fh:
+                content = fh.read()
+            self._path = FILENAME
+            self._offset = content.rfind(b"\n") + 1
+            data = StringIO(content[:self._offset].decode())
+            data.name = FILENAME
+        elif isinstance(FILENAME, str):
             if verbose: print("Loading %s"%FILENAME)
             data=open(FILENAME, "r")
         elif hasattr(FILENAME, "readline"):
@@ -337,54 +1057,46 @@ class FIOdata(object):
             data = FILENAME
         else: raise ValueError('fname must be a string or file handle')
         
-        self.comment=""
-        self.parameters={}
-        colname=[]
+        self.stats = stats = LoadStats(getattr(data, "name", None))
+        t0 = default_timer()
         self.repeats = 1
-        #self.data=np.array([])
-        flag = True
-        while flag:
-            line = data.readline()
-            if not line: break
-            if not line.find("!"):
-                continue
-            if "%c" in line:
-                line = data.readline()
-                while not line.startswith("!"):
-                    if not line: break
-                    self.comment+=line
-                    line = data.readline()
-            if "%p" in line:
-                line = data.readline()
-                while not ("! Data" in line):
-                    if line.startswith("!"): 
-                        line = data.readline()
-                        continue
-                    elif not line: break
-                    line=line.replace(" ","")
-                    [param, value]=line.split("=")
-                    try:
-                        value = float(value)
-                    except:
-                        pass
-                    self.parameters[param] = value
-                    line = data.readline()
-            if "%d" in line:
-                line = data.readline()
-                while not line.startswith("!"):
-                    if not line: break
-                    if "Col" in line:
-                        colname.append(line.split()[2])
-                    else: 
-                        flag = False
-                        break
-                    line = data.readline()
-        numdata = StringIO(line + data.read())
+        line = self._read_header(data, verbose)
+        numdata = line + data.read()
         data.close()
-        self.data=np.genfromtxt(numdata, comments="!")
+        stats.times["header"] = default_timer() - t0
+        if follow:
+            self._header_done = self._header_complete(line)
+            if not self._header_done:
+                # the header is still being written, update() reads it again
+                self._offset = 0
+                numdata = ""
+            self.data = np.empty((0, len(self.colname)))
+            stats.nbytes += len(numdata)
+            stats.count("rows", self._append_rows(numdata))
+        else:
+            stats.nbytes += len(numdata)
+            with stats.phase("parse"):
+                rows = np.genfromtxt(StringIO(numdata), comments="!")
+            self.data = rows.reshape(-1, len(self.colname)) if self.colname \
+                                                            else rows
+            stats.count("rows", len(self))
+        stats.walltime = default_timer() - t0
+        stats.log()
+
+    def _read_header(self, data, verbose=False):
+        """
+            Reads the header from the file handle ``data`` and sets the
+            attributes derived from it.
+
+            Returns the first line of the data block.
+        """
+        self.comment, self.parameters, colname, line = read_fio_header(data)
         i=0
         cond = True
-        if len(colname)<=1:
+        if not colname:
+            self.name = ""
+            self.colname = colname
+        elif len(colname)<=1:
             self.name = colname[0]
             self.colname = colname
         else:
@@ -396,6 +1108,8 @@ class FIOdata(object):
             for j in range(len(colname)):
                 colname[j] = colname[j][(i-1):]
             self.colname = colname
+        self._ncol_file = len(colname)
+        self._colidx = dict((name, j) for (j, name) in enumerate(colname))
         
         words = self.comment.split()
         
@@ -403,15 +1117,7 @@ class FIOdata(object):
             ind = words.index("sampling")
             self.sampletime = float(words[ind+1])
         try:
-            i1 = words.index("ended")
-            day = words[i1-2]
-            time0 = words[i1-1][:-1]
-            timeE = words[i1+1]
-            orglocal = locale.getlocale(locale.LC_TIME)
-            locale.setlocale(locale.LC_TIME, ("en","UTF8"))
-            self.starttime = time.strptime(day + time0, "%d-%b-%Y%H:%M:%S")
-            self.stoptime = time.strptime(day + timeE, "%d-%b-%Y%H:%M:%S")
-            locale.setlocale(locale.LC_TIME, orglocal)
+            self.starttime, self.stoptime = parse_fio_times(self.comment)
             self.startsec = time.mktime(self.starttime)
             self.stopsec = time.mktime(self.stoptime)
         except Exception as err:
@@ -422,18 +1128,108 @@ class FIOdata(object):
             self.stoptime = np.nan
             self.startsec = np.nan
             self.stopsec = np.nan
-        
+        return line
+
+    def _header_complete(self, line):
+        """
+            The header is complete once the column names are followed by
+            the first line of data.
+        """
+        return bool(self.colname) and bool(line.strip()) \
+               and not line.startswith("!")
+
+    def _append_rows(self, numdata):
+        lines = [line for line in numdata.splitlines()
+                      if line.strip() and not line.lstrip().startswith("!")]
+        if lines:
+            with self.stats.phase("parse"):
+                rows = np.genfromtxt(lines)
+            self._append(rows.reshape(len(lines), -1))
+        return len(lines)
+
+    def update(self):
+        """
+            Reads the complete rows appended to the file since the last
+            call. Only available if the file was opened with follow=True.
+            As long as the header is incomplete, it is read again.
+
+            Returns the number of new rows.
+        """
+        if self._path is None:
+            raise ValueError("FIOdata was not opened with follow=True")
+        if len(self.colname) != self._ncol_file:
+            raise ValueError("columns have been changed by normalize()")
+        stats = self.stats
+        t0 = default_timer()
+        with open(self._path, "rb") as fh:
+            fh.seek(self._offset)
+            with stats.phase("read"):
+                content = fh.read()
+        cut = content.rfind(b"\n") + 1
+        numdata = content[:cut].decode()
+        if not self._header_done:
+            data = StringIO(numdata)
+            line = self._read_header(data)
+            if not self._header_complete(line):
+                stats.walltime += default_timer() - t0
+                return 0
+            self._header_done = True
+            self.data = np.empty((0, len(self.colname)))
+            numdata = line + data.read()
+        self._offset += cut
+        stats.nbytes += cut
+        num = self._append_rows(numdata)
+        stats.count("rows", num)
+        stats.walltime += default_timer() - t0
+        return num
+
+    @property
+    def data(self):
+        """
+            The measured data as array of shape (rows, columns).
+
+            The columns are stored contiguously, i.e. this is a transposed
+            view of the column buffer.
+        """
+        return self._columns[:self._ncol, :self._len].T
+
+    @data.setter
+    def data(self, value):
+        value = np.asarray(value)
+        if value.ndim == 1:
+            value = value[:,None]
+        self._columns = np.ascontiguousarray(value.T)
+        self._ncol = len(self._columns)
+        self._len = len(value)
+
+    def _column(self, idx):
+        return self._columns[idx, :self._len]
+
+    def _append(self, rows):
+        num = self._len + len(rows)
+        if num > self._columns.shape[1]:
+            capacity = max(num, 2 * self._columns.shape[1])
+            columns = np.empty((len(self._columns), capacity),
+                               dtype=self._columns.dtype)
+            columns[:, :self._len] = self._columns[:, :self._len]
+            self._columns = columns
+        self._columns[:self._ncol, self._len:num] = rows.T
+        self._len = num
+
     def __len__(self):
-        return self.data.__len__()
+        return self._len
     
     def __getitem__(self, indices):
         """
             Rewritten to handle columns names in FIOdata.colname
         """
-        if isinstance(indices, str) and indices in self.colname:
-            return self.data[:,self.colname.index(indices)]
-        else:
-            return self.data[indices]
+        if isinstance(indices, str):
+            if indices not in self._colidx:
+                self._colidx = dict((name, j) for (j, name)
+                                              in enumerate(self.colname))
+            if indices in self._colidx:
+                return self._column(self._colidx[indices])
+        return self.data[indices]
     def __repr__(self):
         return self.comment
     def parameters_nice(self, format="%.4g"):
@@ -463,36 +1259,56 @@ class FIOdata(object):
         """
             Normalizes all columns to a column specified by ``col`` and
             deletes column ``col``
+
+            The division is done in place and the following columns are
+            moved up within the column buffer, so ``.data`` stays a view.
         """
-        if col in self.colname:
-            col = self.colname.index(col)
+        if col in self._colidx:
+            col = self._colidx[col]
         else:
             try: col = int(col)
             except:
-                collow = map(str.lower, self.colname)
-                thiscol = filter(lambda s: col.lower() in s, collow)
+                collow = [name.lower() for name in self.colname]
+                thiscol = [name for name in collow if col.lower() in name]
                 col = collow.index(thiscol[0])
-        for i in range(len(self.colname)):
-            if i !=col and i!=0:
-                self.data[:,i] /= self.data[:,col]
-        ind = np.ones(len(self.colname)).astype(bool)
-        ind[col]=False
-        self.data = self.data[:,ind]
+        columns = self.data.T # contiguous range of the column buffer
+        ref = columns[col]
+        if col > 1:
+            np.divide(columns[1:col], ref, out=columns[1:col])
+        np.divide(columns[col+1:], ref, out=columns[col+1:])
+        np.copyto(columns[col:-1], columns[col+1:])
+        self._ncol -= 1
         self.colname.pop(col)
+        self._colidx = dict((name, j) for (j, name) in enumerate(self.colname))
     def to_dat(self, FILENAME=None, delimiter=" ", fmt="%.18e"):
         """
             Translates the FIOdata.data into numpy`s default columned data
             string format plus 1 header line and stores it into the file 
             ``FILENAME`` or returns it as string.
+
+            The file is written in chunks, see IKZ.xray.export.
         """
-        output = delimiter.join(self.colname) + "\n"
-        outfile = StringIO()
-        np.savetxt(outfile, self.data, fmt, delimiter)
-        output += outfile.getvalue()
-        outfile.close()
-        if FILENAME == None: return output
+        from .export import write_text
+        if FILENAME == None:
+            output = StringIO()
+            write_text(output, self.colname, self.data.T, delimiter, fmt)
+            return output.getvalue()
         else: 
-            fh = open(FILENAME, "w")
-            fh.write(output)
-            fh.close()
+            write_text(FILENAME, self.colname, self.data.T, delimiter, fmt)
+
+
+readers = {".rasx": RASXfile,
+           ".brml": BRMLfile,
+           ".fio": FIOdata}
 
+
+def load(path, **kwargs):
+    """
+        Opens the measurement file ``path`` with the reader matching its
+        extension (see ``readers``). Keyword arguments are passed to the
+        reader.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in readers:
+        raise ValueError("Unknown file type: %s" % path)
+    return readers[ext](path, **kwargs)
@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+"""
+    Vectorized diffractometer kinematics in pure NumPy.
+
+    The rotation chains are given by axis specifications as used in
+    IKZ.xray.geometry, e.g. ('y-', 'x+', 'z-') from the outer to the inner
+    circle. ``+`` denotes a right handed rotation around the lab axis.
+    The conventions follow xrayutilities.QConversion: the detector arm
+    points along the incident beam at zero angles and Q is given in the
+    frame of the sample.
+
+    q_vectors converts angles to Q, solve_angles finds the angles of the
+    free circles that reach given Q vectors.
+"""
+
+import os
+import numpy as np
+from concurrent import futures
+
+
+HC = 12398.419843320026 # eV * Angstrom
+
+_axis_index = dict(x=0, y=1, z=2)
+
+
+def parse_axis(spec):
+    """
+        Returns index (0, 1, 2) and sense (+1, -1) of an axis
+        specification like 'y-'.
+    """
+    return _axis_index[spec[0]], (1 if spec[1] == "+" else -1)
+
+
+def rotation_matrix(spec, angles, deg=True, dtype=np.float64):
+    """
+        Rotation matrices of shape (..., 3, 3) around the axis ``spec``
+        for an array of ``angles``.
+    """
+    idx, sense = parse_axis(spec)
+    angles = np.asarray(angles, dtype=dtype)
+    if deg:
+        angles = np.radians(angles)
+    c, s = np.cos(angles), sense * np.sin(angles)
+    i, j = (idx + 1) % 3, (idx + 2) % 3
+    mat = np.zeros(angles.shape + (3, 3), dtype=dtype)
+    mat[..., idx, idx] = 1
+    mat[..., i, i] = c
+    mat[..., j, j] = c
+    mat[..., i, j] = -s
+    mat[..., j, i] = s
+    return mat
+
+
+def rotation_matrices(axes, angles, deg=True, dtype=np.float64):
+    """
+        Composes the rotation matrices of a chain of circles ``axes``
+        (outer to inner) for the list ``angles`` holding one array (or
+        scalar) per circle. Returns an array of shape (..., 3, 3).
+    """
+    angles = np.broadcast_arrays(*[np.asarray(a, dtype=dtype) for a in angles])
+    shape = angles[0].shape if angles else ()
+    result = np.broadcast_to(np.eye(3, dtype=dtype), shape + (3, 3))
+    for spec, angle in zip(axes, angles):
+        result = np.matmul(result, rotation_matrix(spec, angle, deg, dtype))
+    return result
+
+
+def _rotate_components(comps, spec, angles, inverse=False):
+    """
+        Rotates the vectors given as component arrays ``comps`` (3, N)
+        in place around the axis ``spec`` by ``angles`` in degree.
+    """
+    idx, sense = parse_axis(spec)
+    if inverse:
+        sense = -sense
+    rad = np.radians(angles)
+    c, s = np.cos(rad), np.sin(rad)
+    if sense < 0:
+        np.negative(s, out=s)
+    vi, vj = comps[(idx + 1) % 3], comps[(idx + 2) % 3]
+    tmp = vi * s
+    vi *= c
+    vi -= s * vj
+    vj *= c
+    vj += tmp
+
+
+def _q_chunk(sample_axes, detector_axes, sample_angles, detector_angles,
+             inc_beam, k, out):
+    comps = np.empty((3, len(out)), dtype=out.dtype)
+    comps[:] = inc_beam[:, None]
+    for spec, angles in reversed(list(zip(detector_axes, detector_angles))):
+        _rotate_components(comps, spec, angles)
+    comps -= inc_beam[:, None]
+    comps *= k
+    for spec, angles in zip(sample_axes, sample_angles):
+        _rotate_components(comps, spec, angles, inverse=True)
+    out[:] = comps.T
+    return out
+
+
+def q_vectors(sample_axes, detector_axes, sample_angles, detector_angles,
+              wavelength=None, energy=8048., inc_beam=(1, 0, 0),
+              dtype=np.float64, chunksize=65536, workers=None):
+    """
+        Momentum transfer Q (1/Angstrom) in the sample frame for many
+        angle tuples at once.
+
+        Inputs:
+            sample_axes     -- specifications of the sample circles
+            detector_axes   -- specifications of the detector circles
+            sample_angles   -- one array (or scalar) of angles in degree
+                               per sample circle
+            detector_angles -- the same for the detector circles
+            wavelength      -- in Angstrom, alternatively ``energy`` in eV
+            dtype           -- float64 or float32
+            chunksize       -- number of vectors processed at once
+            workers         -- number of threads working on the chunks
+
+        Returns an array of shape (N, 3).
+    """
+    if wavelength is None:
+        wavelength = HC / energy
+    dtype = np.dtype(dtype)
+    angles = np.broadcast_arrays(*[np.asarray(a, dtype=dtype).ravel()
+                                   for a in list(sample_angles)
+                                          + list(detector_angles)])
+    num = len(angles[0]) if angles else 1
+    nsample = len(sample_axes)
+    inc_beam = np.asarray(inc_beam, dtype=dtype)
+    inc_beam = inc_beam / np.linalg.norm(inc_beam)
+    k = dtype.type(2 * np.pi / wavelength)
+    out = np.empty((num, 3), dtype=dtype)
+
+    def work(start):
+        sl = slice(start, start + chunksize)
+        return _q_chunk(sample_axes, detector_axes,
+                        [a[sl] for a in angles[:nsample]],
+                        [a[sl] for a in angles[nsample:]],
+                        inc_beam, k, out[sl])
+
+    starts = range(0, num, chunksize)
+    if len(starts) == 1 or workers == 1:
+        for start in starts:
+            work(start)
+    else:
+        with futures.ThreadPoolExecutor(workers or os.cpu_count()) as pool:
+            list(pool.map(work, starts))
+    return out
+
+
+def axis_vector(spec, dtype=np.float64):
+    """
+        Unit vector of the right handed rotation axis ``spec``.
+    """
+    idx, sense = parse_axis(spec)
+    vec = np.zeros(3, dtype=dtype)
+    vec[idx] = sense
+    return vec
+
+
+def _dot(a, b):
+    return (a * b).sum(-1)
+
+
+def _apply(mat, vec, transpose=False):
+    """
+        Products of stacks of matrices (N, 3, 3) and vectors (N, 3).
+    """
+    return np.einsum("...ji,...j->...i" if transpose else "...ij,...j->...i",
+                     mat, vec)
+
+
+def solve_rotation(u, v, spec, target):
+    """
+        Solves  u . R(alpha) v = target  for the rotation R around the
+        axis ``spec`` for stacks of vectors u, v (N, 3) and ``target`` (N).
+
+        Returns both solutions in degree and the mask of the rows where
+        they exist.
+    """
+    n = axis_vector(spec)
+    un, vn = u.dot(n), v.dot(n)
+    # u.R(alpha)v = a*cos(alpha) + b*sin(alpha) + un*vn
+    a = _dot(u, v) - un * vn
+    b = _dot(u, np.cross(n, v))
+    r = np.hypot(a, b)
+    c = target - un * vn
+    degenerate = r < 1e-12
+    ratio = c / np.where(degenerate, 1., r)
+    valid = np.where(degenerate, abs(c) < 1e-9, abs(ratio) <= 1 + 1e-12)
+    delta = np.where(degenerate, 0., np.arccos(np.clip(ratio, -1, 1)))
+    phi = np.arctan2(b, a)
+    return np.degrees(phi + delta), np.degrees(phi - delta), valid
+
+
+def rotation_angle(v, w, spec):
+    """
+        Angle in degree of the rotation around the axis ``spec`` that
+        turns the vectors v (N, 3) towards w (N, 3).
+    """
+    n = axis_vector(spec)
+    return np.degrees(np.arctan2(np.cross(v, w).dot(n),
+                                 _dot(v, w) - v.dot(n) * w.dot(n)))
+
+
+def _partial_products(axes, angles):
+    """
+        Products R_0 ... R_(j-1) of the chain for j = 0 ... len(axes).
+    """
+    num = len(angles[0]) if len(angles) else 1
+    result = [np.broadcast_to(np.eye(3), (num, 3, 3))]
+    for spec, angle in zip(axes, angles):
+        result.append(np.matmul(result[-1], rotation_matrix(spec, angle)))
+    return result
+
+
+def q_jacobian(sample_axes, detector_axes, angles, inc_beam, k):
+    """
+        Momentum transfer Q (N, 3) in the sample frame and its derivatives
+        (N, 3, M) with respect to the M = len(sample_axes + detector_axes)
+        angles (N, M) in degree.
+    """
+    nsample = len(sample_axes)
+    sample = _partial_products(sample_axes, angles.T[:nsample])
+    detector = _partial_products(detector_axes, angles.T[nsample:])
+    kf = _apply(detector[-1], inc_beam)
+    qlab = k * (kf - inc_beam)
+    smat = sample[-1]
+    columns = []
+    # d(R v)/dalpha = n x (R v) with n the rotated axis of the circle
+    for mat, spec in zip(sample[:-1], sample_axes):
+        axis = _apply(mat, axis_vector(spec))
+        columns.append(-_apply(smat, np.cross(axis, qlab), True))
+    for mat, spec in zip(detector[:-1], detector_axes):
+        axis = _apply(mat, axis_vector(spec))
+        columns.append(_apply(smat, k * np.cross(axis, kf), True))
+    jac = np.stack(columns, axis=-1) if columns else np.zeros(kf.shape + (0,))
+    return _apply(smat, qlab, True), np.radians(jac)
+
+
+def _detector_candidates(detector_axes, angles, d1, Q, inc_beam, k):
+    """
+        Both solutions for the free detector circle ``d1`` reaching |Q|
+        and the mask of the rows where they exist. ``angles`` are the
+        detector angles (N, len(detector_axes)).
+    """
+    dangles = angles.T
+    # scattering angle from |Q|: r_i . D r_i = 1 - |Q|^2 / (2 k^2)
+    outer = rotation_matrices(detector_axes[:d1], dangles[:d1])
+    inner = rotation_matrices(detector_axes[d1+1:], dangles[d1+1:])
+    cos2theta = 1 - _dot(Q, Q) / (2 * k**2)
+    u = _apply(outer, inc_beam, True) * np.ones_like(Q)
+    v = _apply(inner, inc_beam) * np.ones_like(Q)
+    return solve_rotation(u, v, detector_axes[d1], cos2theta)
+
+
+def _analytic_candidates(sample_axes, detector_axes, angles, free, Q,
+                         inc_beam, k):
+    """
+        Closed form solutions for one free detector and two free sample
+        circles. Yields the four candidate angle arrays and masks.
+    """
+    nsample = len(sample_axes)
+    s1, s2 = np.flatnonzero(free[:nsample])
+    d1 = np.flatnonzero(free[nsample:])[0]
+    sangles = angles.T[:nsample]
+    tth1, tth2, tthvalid = _detector_candidates(detector_axes,
+                                                angles[:, nsample:], d1, Q,
+                                                inc_beam, k)
+
+    # S Q = q_lab with S = A R1(alpha) B R2(beta) C
+    amat = rotation_matrices(sample_axes[:s1], sangles[:s1])
+    bmat = rotation_matrices(sample_axes[s1+1:s2], sangles[s1+1:s2])
+    cmat = rotation_matrices(sample_axes[s2+1:], sangles[s2+1:])
+    n1 = axis_vector(sample_axes[s1])
+    bn1 = _apply(bmat, n1 * np.ones_like(Q), True)
+    qc = _apply(cmat, Q)
+    for tth in (tth1, tth2):
+        result = angles.copy()
+        result[:, nsample + d1] = tth
+        qlab = k * (_apply(rotation_matrices(detector_axes,
+                                             result.T[nsample:]),
+                           inc_beam) - inc_beam)
+        w = _apply(amat, qlab, True)
+        beta1, beta2, betavalid = solve_rotation(bn1, qc, sample_axes[s2],
+                                                 w.dot(n1))
+        for beta in (beta1, beta2):
+            v = _apply(bmat, _apply(rotation_matrix(sample_axes[s2], beta), qc))
+            result = result.copy()
+            result[:, s1] = rotation_angle(v, w, sample_axes[s1])
+            result[:, s2] = beta
+            yield result, tthvalid & betavalid
+
+
+def _wrap(angles, start, limits):
+    """
+        Shifts the angles by multiples of 360 degree next to ``start`` or
+        into ``limits`` (list of (min, max) or None per circle).
+    """
+    angles = start + (angles - start + 180) % 360 - 180
+    inside = np.ones(len(angles), dtype=bool)
+    for i, lim in enumerate(limits or ()):
+        if lim is None:
+            continue
+        lo, hi = lim
+        col = angles[:, i]
+        col[col < lo] += 360
+        col[col > hi] -= 360
+        inside &= (col >= lo) & (col <= hi)
+    return angles, inside
+
+
+def _start_candidate(tth, valid, start, idx, limits):
+    """
+        Wrapped detector angle ``tth`` of circle ``idx``, mask of the
+        rows where it is unusable and its distance from the start value.
+    """
+    candidate = start.copy()
+    candidate[:, idx] = tth
+    candidate, inside = _wrap(candidate, start, limits)
+    return (~(valid & inside), abs(candidate[:, idx] - start[:, idx]),
+            candidate[:, idx])
+
+
+def solve_angles(sample_axes, detector_axes, sample_angles, detector_angles,
+                 free, Q, wavelength=None, energy=8048., inc_beam=(1, 0, 0),
+                 limits=None, tol=1e-8, maxiter=50, maxstep=20.):
+    """
+        Angles that reach the momentum transfers Q (N, 3, sample frame)
+        for many targets at once.
+
+        Inputs:
+            sample_angles   -- one array (or scalar) per sample circle:
+                               position of fixed circles, start value of
+                               free circles
+            detector_angles -- the same for the detector circles
+            free            -- booleans for sample + detector circles
+            limits          -- (min, max) or None for each circle
+            tol             -- tolerance of |Q| in 1/Angstrom
+            maxiter         -- maximum number of Newton iterations
+            maxstep         -- maximum change of an angle per iteration
+
+        With one free detector and two free sample circles the solution
+        is computed in closed form: of the up to four solutions per target
+        the one closest to the start values within the limits is taken.
+        Otherwise, damped Newton iterations with the pseudo-inverse of the
+        Jacobian are done starting from the start values, i.e. for more
+        than three free circles the solution closest to the start is
+        found. The limits are only checked, not enforced, in this case.
+
+        Returns the angles (N, M) of all circles and the mask of the
+        reachable targets.
+    """
+    if wavelength is None:
+        wavelength = HC / energy
+    k = 2 * np.pi / wavelength
+    Q = np.atleast_2d(np.asarray(Q, dtype=float))
+    free = np.asarray(free, dtype=bool)
+    nsample = len(sample_axes)
+    if not free.any():
+        raise ValueError("No free circles to solve for")
+    inc_beam = np.asarray(inc_beam, dtype=float)
+    inc_beam = inc_beam / np.linalg.norm(inc_beam)
+    start = np.column_stack([np.broadcast_to(np.asarray(a, dtype=float),
+                                             (len(Q),))
+                             for a in list(sample_angles)
+                                    + list(detector_angles)])
+    residual = lambda angles: np.linalg.norm(
+        q_jacobian(sample_axes, detector_axes, angles, inc_beam, k)[0] - Q,
+        axis=-1)
+
+    if free[:nsample].sum() == 2 and free[nsample:].sum() == 1:
+        best = start.copy()
+        reachable = np.zeros(len(Q), dtype=bool)
+        distance = np.full(len(Q), np.inf)
+        for angles, valid in _analytic_candidates(sample_axes, detector_axes,
+                                                  start, free, Q, inc_beam, k):
+            angles, inside = _wrap(angles, start, limits)
+            valid &= inside & (residual(angles) < tol)
+            dist = ((angles - start)**2).sum(-1)
+            better = valid & (dist < distance)
+            best[better] = angles[better]
+            distance[better] = dist[better]
+            reachable |= valid
+        return best, reachable
+
+    angles = start.copy()
+    if free[nsample:].sum() == 1:
+        # start from the closed form solution of the detector circle
+        d1 = nsample + np.flatnonzero(free[nsample:])[0]
+        tth1, tth2, valid = _detector_candidates(detector_axes,
+                                                 start[:, nsample:],
+                                                 d1 - nsample, Q, inc_beam, k)
+        (bad1, dist1, tth1), (bad2, dist2, tth2) = [
+            _start_candidate(tth, valid, start, d1, limits)
+            for tth in (tth1, tth2)]
+        second = (bad1 & ~bad2) | ((bad1 == bad2) & (dist2 < dist1))
+        angles[:, d1] = np.where(second, tth2, tth1)
+    active = np.ones(len(Q), dtype=bool)
+    for _ in range(maxiter):
+        qcalc, jac = q_jacobian(sample_axes, detector_axes, angles[active],
+                                inc_beam, k)
+        diff = Q[active] - qcalc
+        done = np.linalg.norm(diff, axis=-1) < tol
+        idx = np.flatnonzero(active)
+        active[idx[done]] = False
+        if not active.any():
+            break
+        jac, diff = jac[~done][..., free], diff[~done]
+        step = _apply(np.linalg.pinv(jac, rcond=1e-10), diff)
+        scale = np.maximum(abs(step).max(-1, keepdims=True) / maxstep, 1)
+        angles[np.ix_(idx[~done], np.flatnonzero(free))] += step / scale
+    angles, inside = _wrap(angles, start, limits)
+    return angles, inside & (residual(angles) < tol)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+    Import time benchmark of the IKZ subpackages.
+
+    Every statement is timed in fresh interpreters (best of ``--repeat``
+    runs). The script fails if one of them loads a heavy dependency that
+    it does not need, e.g. xrayutilities for reading .fio files:
+
+        python benchmarks/import_time.py
+"""
+
+from __future__ import print_function
+import sys
+import json
+import argparse
+import subprocess
+
+
+# statement -> heavy modules that must not be loaded by it
+CASES = [
+    ("import IKZ.xray", ("xrayutilities", "xmltodict", "matplotlib")),
+    ("import IKZ.plot", ("ipywidgets", "IPython", "matplotlib")),
+    ("import IKZ.process", ("scipy", "matplotlib")),
+    ("from IKZ.xray.io import FIOdata", ("xrayutilities", "xmltodict")),
+    ("from IKZ.process.array import take_fractional", ("scipy", "xrayutilities")),
+    ("from IKZ.xray import catalogue, export", ("xrayutilities",)),
+    ("from IKZ.xray.geometry import SmartLab", ("xrayutilities",)),
+    ("from IKZ.xray.batch import main", ("xrayutilities", "h5py", "scipy")),
+]
+
+HEAVY = sorted(set(mod for case in CASES for mod in case[1]))
+
+PROBE = """
+import sys, json, time
+t0 = time.perf_counter()
+exec(%r)
+dt = time.perf_counter() - t0
+print(json.dumps([dt, [mod for mod in %r if mod in sys.modules]]))
+"""
+
+
+def run(statement):
+    output = subprocess.check_output([sys.executable, "-c",
+                                      PROBE % (statement, HEAVY)])
+    return json.loads(output.decode().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for statement, forbidden in CASES:
+        results = [run(statement) for _ in range(args.repeat)]
+        best = min(dt for (dt, loaded) in results)
+        loaded = results[0][1]
+        bad = sorted(set(loaded).intersection(forbidden))
+        failed |= bool(bad)
+        print("%-50s %8.1f ms  %s" % (statement, 1e3 * best,
+                                      "loads " + ", ".join(bad) if bad else ""))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+    Validation and benchmark of the vectorized angle to Q conversion.
+
+    For every geometry of IKZ.xray.geometry random motor positions are
+    converted with EmptyGeometry.angles_to_Q (float64 and float32) and with
+    xrayutilities.QConversion. The script fails if the results deviate by
+    more than the tolerance of the respective precision:
+
+        python benchmarks/qconversion.py --num 1000000
+"""
+
+from __future__ import print_function
+import sys
+import time
+import argparse
+import numpy as np
+
+from IKZ.xray import geometry
+
+
+GEOMETRIES = ("SmartLab", "BrukerD8", "P08kohzu", "ID01psic", "P23SixC")
+
+# maximum absolute deviation in 1/Angstrom
+TOLERANCE = {np.float64: 1e-10, np.float32: 1e-4}
+
+
+def timed(func, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - t0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--num", type=int, default=100000,
+                        help="number of angle tuples")
+    parser.add_argument("--energy", type=float, default=8048.)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=65536)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    failed = False
+    print("%-10s %-10s %12s %12s %10s" % ("geometry", "dtype", "time [ms]",
+                                          "speedup", "max. dev."))
+    for name in GEOMETRIES:
+        geo = getattr(geometry, name)()
+        sample_ax, detector_ax = geo.get_axes()
+        motors = [mot for (mot, ax) in sample_ax + detector_ax]
+        angles = dict((mot, rng.uniform(-90, 90, args.num)) for mot in motors)
+
+        qconv = geo.getQconversion()
+        ref, t_ref = timed(qconv, *[angles[mot] for mot in motors],
+                           en=args.energy)
+        ref = np.column_stack(ref)
+        print("%-10s %-10s %12.1f" % (name, "xu", 1e3 * t_ref))
+
+        for dtype in (np.float64, np.float32):
+            result, dt = timed(geo.angles_to_Q, energy=args.energy,
+                               dtype=dtype, chunksize=args.chunksize,
+                               workers=args.workers, **angles)
+            dev = abs(result - ref).max()
+            failed |= not dev <= TOLERANCE[dtype]
+            print("%-10s %-10s %12.1f %12.1f %10.1e" % (
+                  name, np.dtype(dtype).name, 1e3 * dt, t_ref / dt, dev))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,13 +15,14 @@ setup(
                 'IKZ.plot',
                 'IKZ.process',
                 ],
+    py_modules = ['IKZ._lazy'],
 #    package_data = {
 #       "IKZ": ["media/*"]},
-#    entry_points={ #later
-#        'console_scripts': [
-#            'id01_microscope_contrast=id01lib.camtools:get_microscope_contrast',
-#        ],
-#    },
+    entry_points={
+        'console_scripts': [
+            'ikz_batch_reduce=IKZ.xray.batch:main',
+        ],
+    },
     install_requires=[
                       'numpy',
                       'xrayutilities',
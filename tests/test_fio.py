@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+    Reading of .fio files.
+"""
+
+import time
+
+from IKZ.xray import io
+
+
+COMMENT = ("ascan omh 0.0 1.0 10 1.0\n"
+           "user p08user Acquisition started at Thu %s 23:00:00, "
+           "ended 23:05:00\n")
+
+
+def test_parse_fio_times():
+    for month in range(1, 13):
+        day = "12-%s-2019" % io._fio_months[month - 1].title()
+        start, stop = io.parse_fio_times(COMMENT % day)
+        assert (start.tm_year, start.tm_mon, start.tm_mday) == (2019, month, 12)
+        assert time.mktime(stop) - time.mktime(start) == 300
+
+
+HEADER = ("!\n! Comments\n!\n%%c\n%s!\n! Data\n!\n%%d\n"
+          % (COMMENT % "12-Sep-2019"))
+COLUMNS = " Col 1 scan_om DOUBLE\n Col 2 scan_det DOUBLE\n"
+
+
+def test_follow_incomplete_header(tmp_path):
+    path = str(tmp_path / "scan_00001.fio")
+    with open(path, "w") as fh:
+        fh.write(HEADER)
+    fio = io.FIOdata(path, follow=True)
+    assert len(fio) == 0
+    with open(path, "a") as fh:
+        fh.write(COLUMNS[:30])
+    assert fio.update() == 0
+    with open(path, "a") as fh:
+        fh.write(COLUMNS[30:] + " 0.0 10\n 0.1 ")
+    assert fio.update() == 1
+    assert fio.colname == ["om", "det"]
+    with open(path, "a") as fh:
+        fh.write("20\n")
+    assert fio.update() == 1
+    assert fio["det"].tolist() == [10, 20]
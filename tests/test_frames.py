@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+    Indexing and projections of FrameStack.
+"""
+
+import numpy as np
+
+from IKZ.process.frames import FrameStack
+
+
+def make_stack():
+    frames = np.zeros((4, 6, 8), dtype=np.uint32)
+    frames[0] = np.arange(48).reshape(6, 8) # dense
+    frames[1, 2, 3] = 7                     # sparse
+    frames[2, ::2, 1::3] = 5
+    frames[3, 5, 7] = 70000
+    return frames, FrameStack(frames)
+
+
+def test_boolean_mask():
+    frames, stack = make_stack()
+    mask = np.array([True, False, True, False])
+    assert np.array_equal(np.asarray(stack[mask]), frames[mask])
+    assert np.array_equal(np.asarray(stack[list(mask)]), frames[mask])
+    assert np.array_equal(stack[mask, 2], frames[mask, 2])
+
+
+def test_roi_sum():
+    frames, stack = make_stack()
+    for roi in [np.s_[1:5, 2:7], np.s_[::2, 1::3], np.s_[5:0:-2, ::-3],
+                np.s_[2, 3], np.s_[-1, 1:], np.s_[2:4, :]]:
+        dense = frames[(slice(None),) + roi].reshape(len(frames), -1)
+        assert np.array_equal(stack.roi_sum(roi), dense.sum(1))
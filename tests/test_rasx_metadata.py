@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+    RASX metadata parsing of MesurementConditions*.xml files that use
+    namespace prefixes declared on the root element only.
+"""
+
+import zipfile
+import numpy as np
+from io import BytesIO
+
+from IKZ.xray import io, catalogue
+
+
+NAMESPACED = b'''<?xml version="1.0" encoding="utf-8"?>
+<MeasurementConditions xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+  <GeneralInformation><SoftwareVersion>1.0</SoftwareVersion><Comment xsi:nil="true" /></GeneralInformation>
+  <ScanInformation><AxisName>TwoThetaOmega</AxisName><StartTime>2020-01-01T10:00:00Z</StartTime><Start>10</Start></ScanInformation>
+  <SampleInformation><SampleName>GaN</SampleName><Thickness xsi:nil="true" /></SampleInformation>
+  <HWConfigurations>
+    <Categories><Category Name="Detector" SelectedUnit="HyPix3000(H)" /></Categories>
+    <Optics><Item>Ge220x2</Item></Optics>
+    <Distances><Distance To="Detector" From="Sample" Unit="mm" Value="300" /></Distances>
+    <XrayGenerator><Voltage>40</Voltage><Current xsi:nil="true" /></XrayGenerator>
+  </HWConfigurations>
+  <RASHeader>
+    <Pair><Key>MEAS_COND_AXIS_NAME-0</Key><Value>Omega</Value></Pair>
+    <Pair><Key>MEAS_COND_AXIS_NAME-1</Key><Value>2-Theta</Value></Pair>
+    <Pair><Key>FILE_COMMENT</Key><Value xsi:nil="true" /></Pair>
+  </RASHeader>
+  <Axes>
+    <Axis Name="Omega" Unit="deg" Offset="0" Position="10.5" />
+    <Axis Name="TwoTheta" Unit="deg" Offset="0" Position="21" />
+  </Axes>
+</MeasurementConditions>'''
+
+
+def make_rasx(path, nprof=3, npts=10):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as fh:
+        for i in range(nprof):
+            rows = ["%g\t%i\t1" % (20 + 0.1 * j, 100 + j) for j in range(npts)]
+            fh.writestr("Data0/Profile%i.txt" % i,
+                        b"\xef\xbb\xbf" + "\n".join(rows).encode())
+            fh.writestr("Data0/MesurementConditions%i.xml" % i, NAMESPACED)
+
+
+def test_namespaced_sections():
+    fast = io.RASXMetaParser()(NAMESPACED)
+    slow = io.parse_rasx_metadata(BytesIO(NAMESPACED))
+    assert fast == slow
+    assert fast["Axes"]["Omega"].Position == 10.5
+
+
+def test_namespaced_rasxfile(tmp_path):
+    path = str(tmp_path / "ns.rasx")
+    make_rasx(path)
+    fast = io.RASXfile(path, verbose=False)
+    slow = io.RASXfile(path, verbose=False, fast_meta=False)
+    assert len(fast.data) == 3
+    np.testing.assert_array_equal(np.asarray(fast.data), np.asarray(slow.data))
+    assert fast.meta[0] == slow.meta[0]
+
+
+def test_namespaced_catalogue(tmp_path):
+    path = str(tmp_path / "ns.rasx")
+    make_rasx(path)
+    entry = catalogue.read_header(path)
+    assert "error" not in entry
+    assert entry["sample"] == "GaN"
+    assert entry["axis"] == "TwoThetaOmega"